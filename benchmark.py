@@ -0,0 +1,814 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Měření výkonu jednotlivých částí xtd.py.
+# Spuštění: python3 benchmark.py [--json=soubor] [parametry dokumentu] [nazev_mereni ...]
+# bez zadání názvu se spustí všechna měření ze slovníku BENCHMARKS,
+# s parametrem --json se výsledky navíc uloží do souboru ve formátu JSON
+# (pro porovnání jednotlivých běhů v čase), parametry dokumentu (--width,
+# --depth, ...) nahradí výchozí dokumenty měření 'stages' jediným dokumentem.
+
+import argparse
+import datetime
+import io
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+
+import xtd
+
+
+# Původní rekurzivní průchod stromem (pouze getchildren() nahrazeno
+# za list(root)), slouží jako reference pro porovnání s xtd.do_xml().
+def do_xml_recursive(tree, root, param_a, work_dict):
+    """puvodni rekurzivni implementace do_xml"""
+
+    counter = {}
+    for child in list(root):
+        child.tag = child.tag.lower()
+        if child.tag not in work_dict.keys():
+            work_dict[child.tag.lower()] = xtd.TableElement(child.tag.lower())
+
+        if root != tree.getroot():
+            try:
+                counter[child.tag] += 1
+            except:
+                counter[child.tag] = 1
+
+        if not param_a:
+            for actual in child.attrib:
+                tag = child.tag.lower()
+                if xtd.get_type(child.attrib[actual].lower()) == xtd.STR:
+                    work_dict[tag].give_atr(actual.lower(), xtd.NVARCHAR)
+                else:
+                    attr = child.attrib
+                    work_dict[tag].give_atr(actual.lower(), xtd.get_type(attr[actual.lower()].lower()))
+        do_xml_recursive(tree, child, param_a, work_dict)
+
+    if format(root.text).strip() != '' and root.text != None:
+        data = xtd.get_type(root.text.lower())
+        if data == xtd.STR:
+            data = xtd.NTEXT
+        try:
+            value = work_dict[root.tag.lower()].atributs["value"]
+            if data > value:
+                work_dict[root.tag.lower()].atributs["value"] = data
+        except:
+            work_dict[root.tag.lower()].atributs["value"] = data
+
+    for key in counter:
+        key = key.lower()
+        work_dict[root.tag.lower()].givefkey(key, counter[key])
+
+# Původní třída tabulky (atributy instance ve slovníku __dict__, typy sloupců
+# ve slovníku), slouží jako reference pro porovnání s xtd.TableElement.
+class TableElementReference:
+    """puvodni trida tabulky"""
+    def __init__(self, tag):
+        self.tag = tag
+        self.atributs = {}
+        self.fkey = {}
+
+    def give_atr(self, name, type_of_elm):
+        try:
+            if self.atributs[name] < type_of_elm:
+                self.atributs[name] = type_of_elm
+        except:
+            self.atributs[name] = type_of_elm
+
+    def givefkey(self, tag, count):
+        if tag not in self.fkey:
+            self.fkey[tag] = count
+        else:
+            if self.fkey[tag] < count:
+                self.fkey[tag] = count
+
+# Původní implementace get_type() řízená výjimkami, slouží jako reference
+# pro kontrolu shody a pro porovnání rychlosti s xtd.get_type().
+def get_type_reference(element):
+    """puvodni implementace get_type"""
+
+    if element == '1' or element == '0' or element == 'false' or element == 'true':
+        return xtd.BIT
+    try:
+        int(element)
+        return xtd.INT
+    except ValueError:
+        pass
+    try:
+        float(element)
+        return xtd.FLOAT
+    except ValueError:
+        pass
+    if element.strip() == "":
+        return xtd.BIT
+    return xtd.STR
+
+# Korpus hodnot pro kontrolu shody xtd.get_type(x) s get_type_reference(x.lower())
+CONFORMANCE = [
+    "", " ", "\t\n", "\u00a0", "\u3000", "0", "1", " 1", "1 ", "01", "00", "2",
+    "-0", "+1", "-12", "+-1", "--1", "1_000", "1__000", "_1", "1_", "10_",
+    "true", "True", "TRUE", "false", "FaLsE", " true", "truee", "yes",
+    "1.0", "1.", ".5", ".", "-.5", "+.5e3", "1e5", "1E5", "1e", "e5", "1e+5",
+    "1e-5", "1.5e_3", "1_0.5", "1_0.5_5", "1._5", "1_.5", "1e1_0", "1.e3",
+    "inf", "INF", "-inf", "+Infinity", "infinit", "infinity1", "nan", "NaN",
+    "-nan", "nanx", "0x10", "0b1", "1j", "1/2", "1,5", "12abc", "abc",
+    "\u0663", "\u0663\u0664", "\u00b2", "\u0663.\u0664", "\uff11", "\u0131nf",
+    "\u0130nf", "\u212a", " -1.5e10 ", "\u00a01\u00a0", "1\u200b", "a b",
+]
+
+# Původní výpočet relací pro parametr '-g' (slovník slovníků a rekurzivní
+# funkce transit()), slouží jako reference pro porovnání s xtd.transit().
+def get_rel_reference(rel, helper, rel_a, rel_b, over):
+    """puvodni ulozeni hodnoty kardinalit relace"""
+
+    helper[rel_a][rel_b] = {}
+    helper[rel_a][rel_b]["vlastni"] = rel[rel_a][over]["vlastni"]
+    helper[rel_a][rel_b]["cizy"] = rel[over][rel_b]["cizy"]
+
+def transit_reference(rel, helper):
+    """puvodni vypocet tranzitivnich relaci"""
+
+    changed = False
+    for table in rel:
+        for relation in rel[table]:
+            for far in rel[relation]:
+                if rel[relation][far]["vlastni"] == "1":
+                    if rel[relation][far]["cizy"] == "1":
+                        rel[relation][far]["vlastni"] = "N"
+                        rel[relation][far]["cizy"] = "N"
+    for over in rel:
+        for rel_a in rel[over]:
+            for rel_b in rel[over]:
+                if rel_b != rel_a:
+                    get_rel_reference(rel, helper, rel_a, rel_b, over)
+    for table in helper:
+        for relation in helper[table]:
+            if relation not in rel[table]:
+                rel[table][relation] = helper[table][relation]
+                changed = True
+        helper[table] = {}
+    if changed:
+        transit_reference(rel, helper)
+
+def relations_reference(work_dict):
+    """puvodni sestaveni pocatecnich relaci"""
+
+    rel = {}
+    helper = {}
+    for table in work_dict:
+        helper[table] = {}
+        rel[table] = {table: {"vlastni": "1", "cizy": "1"}}
+    for table in work_dict:
+        for key in work_dict[table].fkey:
+            if key in rel[table]:
+                rel[table][key] = {"vlastni": "N", "cizy": "N"}
+                rel[key][table] = {"vlastni": "N", "cizy": "N"}
+            else:
+                rel[table][key] = {"vlastni": "1", "cizy": "N"}
+                rel[key][table] = {"vlastni": "N", "cizy": "1"}
+    return rel, helper
+
+# Původní obrácení vazeb (--etc) a kontrola kolizí jmen (průchod všemi
+# dvojicemi cizí klíč x atribut), slouží jako reference pro porovnání
+# s xtd.schema_normalize().
+def normalize_reference(work_dict, num):
+    """puvodni --etc, name_check a inspect"""
+
+    for table in work_dict:
+        to_del = []
+        for key in work_dict[table].fkey:
+            count = work_dict[table].fkey[key]
+            if count > num:
+                if table in work_dict[key].fkey:
+                    raise xtd.XtdConflictError("etc")
+                work_dict[key].givefkey(table, 0)
+                to_del.extend([key])
+        for i in to_del:
+            del work_dict[table].fkey[i]
+
+    old = xtd.name_check(work_dict)
+    for table in work_dict:
+        for key in work_dict[table].fkey:
+            if "pkr_" + table + "_id" == key + "_id":
+                raise xtd.XtdConflictError("pk")
+            for atribut in work_dict[table].atributs:
+                if key + "_id" == atribut:
+                    raise xtd.XtdConflictError("fkey")
+                if "pkr_" + table + "_id" == atribut:
+                    raise xtd.XtdConflictError("pk")
+    return old
+
+# Původní přidělování jmen opakovaných cizích klíčů (po jednom jméně, při
+# kolizi se rozsah posouvá), slouží jako reference pro xtd.name_alloc().
+def name_alloc_reference(fkey):
+    """puvodni name_alloc"""
+
+    names = {}
+    for key in fkey:
+        if fkey[key] > 1:
+            count = fkey[key]
+            names[key] = []
+            i = 1
+            while i < (count + 1):
+                if key + str(i) in fkey:
+                    count += 1
+                else:
+                    names[key].append(key + str(i))
+                i += 1
+    return names
+
+# ---------------- GENEROVANI VSTUPU ---------------- #
+
+def gen_wide(width):
+    """siroky dokument: width zaznamu s atributy, textem a opakovanymi potomky"""
+
+    parts = ["<root>"]
+    for i in range(width):
+        parts.append('<Item id="%d" name="n%d" flag="true">' % (i, i))
+        parts.append("<Price>%d.5</Price><Tag>a</Tag><Tag>b</Tag>" % i)
+        parts.append("</Item>")
+    parts.append("</root>")
+    return "".join(parts)
+
+def gen_deep(depth):
+    """hluboky dokument: depth vnorenych elementu"""
+
+    return ("<root>" + "<level n=\"1\">" * depth + "x"
+            + "</level>" * depth + "</root>")
+
+def gen_schema(tables, component):
+    """slovnik tabulek: skupiny po component tabulkach, kazda tabulka skupiny
+    (krome prvni) odkazuje na nahodnou predchozi tabulku teze skupiny"""
+
+    rnd = random.Random(tables)
+    work_dict = {}
+    for i in range(tables):
+        work_dict["t%d" % i] = xtd.TableElement("t%d" % i)
+    for i in range(tables):
+        first = i - i % component
+        if i > first:
+            work_dict["t%d" % i].givefkey("t%d" % rnd.randint(first, i - 1), 1)
+    return work_dict
+
+def gen_wide_schema(tables, columns, fkeys):
+    """slovnik tabulek: tables sirokych tabulek s columns sloupci a fkeys
+    cizimi klici (s cetnostmi 1 az 3) do spolecnych listovych tabulek"""
+
+    work_dict = {}
+    for i in range(fkeys):
+        work_dict["k%d" % i] = xtd.TableElement("k%d" % i)
+    for i in range(tables):
+        table = xtd.TableElement("w%d" % i)
+        for j in range(columns):
+            table.give_atr("c%d" % j, xtd.INT)
+        for j in range(fkeys):
+            table.givefkey("k%d" % j, (i + j) % 3 + 1)
+        work_dict[table.tag] = table
+    return work_dict
+
+# Parametrizovaný syntetický dokument:
+#   - width     = počet záznamů (podelementů kořene)
+#   - depth     = hloubka záznamu (počet vnořených úrovní)
+#   - tags      = počet různých jmen elementů
+#   - repeat    = počet stejnojmenných sourozenců na každé úrovni (pro --etc
+#                 a přejmenování cizích klíčů funkcí name_check())
+#   - attrs     = počet atributů každého elementu
+#   - namespace = kořen deklaruje výchozí jmenný prostor
+# jména elementů jsou rozdělena do skupin podle úrovně, element úrovně l má
+# podelementy pouze ze skupiny úrovně l + 1 (pro tags > depth tedy vazby
+# netvoří cykly), hodnoty atributů a textu střídají typy BIT, INT, FLOAT a text
+def gen_xml(width, depth, tags, repeat, attrs, namespace=False, seed=0):
+    """syntetický dokument dle zadanych parametru"""
+
+    rnd = random.Random(seed)
+    values = ("true", "0", "17", "-3", "2.5", "1e3", "abc", "Lorem ipsum")
+    names = ["t%d" % i for i in range(tags)]
+    bands = []
+    for level in range(depth + 1):
+        low = level * tags // (depth + 1)
+        bands.append(names[low:max(low + 1, (level + 1) * tags // (depth + 1))])
+
+    def start(tag):
+        parts.append("<" + tag)
+        for i in range(attrs):
+            parts.append(' a%d="%s"' % (i, rnd.choice(values)))
+        parts.append(">")
+
+    parts = ['<root xmlns="urn:benchmark">' if namespace else "<root>"]
+    for _ in range(width):
+        chain = []
+        for level in range(depth):
+            tag = rnd.choice(bands[level])
+            start(tag)
+            chain.append(tag)
+            leaf = rnd.choice(bands[level + 1])
+            for _ in range(repeat):
+                start(leaf)
+                parts.append(rnd.choice(values) + "</" + leaf + ">")
+        for tag in reversed(chain):
+            parts.append("</" + tag + ">")
+    parts.append("</root>")
+    return "".join(parts)
+
+# ---------------- MERENI ---------------- #
+
+# výsledky měření pro uložení do souboru JSON (parametr --json)
+RESULTS = []
+CURRENT = [None]
+
+def record(**result):
+    """ulozi jeden vysledek mereni"""
+
+    RESULTS.append(dict(benchmark=CURRENT[0], **result))
+
+def measure(func, repeat=3):
+    """vraci nejlepsi cas (v sekundach) z repeat spusteni funkce func"""
+
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+def report(name, seconds):
+    """vytiskne jeden radek vysledku"""
+
+    record(name=name, seconds=seconds)
+    if seconds is None:
+        sys.stdout.write("{:<50} {:>12}\n".format(name, "selhalo"))
+    else:
+        sys.stdout.write("{:<50} {:>10.4f} s\n".format(name, seconds))
+
+def run_walker(walker, tree):
+    """spusti pruchod stromem nad jiz sestavenym stromem"""
+
+    walker(tree, tree.getroot(), 0, {})
+
+# Porovnání rekurzivního a iterativního průchodu stromem (do_xml) na širokém
+# a na hlubokém dokumentu, měří se pouze průchod (bez parsování).
+# Rekurzivní varianta pro hloubku nad limitem rekurze selže (RecursionError).
+def bench_walker():
+    """porovnani rekurzivniho a iterativniho pruchodu stromem"""
+
+    for name, text in (("siroky (100000 zaznamu)", gen_wide(100000)),
+                       ("hluboky (5000 urovni)", gen_deep(5000))):
+        tree = ET.ElementTree(ET.fromstring(text))
+        for label, walker in (("rekurzivni", do_xml_recursive),
+                              ("iterativni", xtd.do_xml)):
+            try:
+                seconds = measure(lambda: run_walker(walker, tree))
+            except RecursionError:
+                seconds = None
+            report("do_xml {} - {}".format(label, name), seconds)
+
+# Kontrola shody xtd.get_type() s původní implementací na korpusu CONFORMANCE
+# a porovnání rychlosti na hodnotách typických pro reálná data (opakující se
+# výčtové hodnoty, čísla a delší texty).
+def bench_get_type():
+    """kontrola shody a porovnani rychlosti get_type"""
+
+    for value in CONFORMANCE:
+        expected = get_type_reference(value.lower())
+        if xtd.get_type(value) != expected:
+            sys.stderr.write("ERROR:get_type({!r}) != {}\n".format(value, expected))
+            sys.exit(1)
+    report("get_type - shoda ({} hodnot)".format(len(CONFORMANCE)), 0.0)
+
+    enums = ["active", "inactive", "pending", "true", "false", "EUR", "CZK"]
+    values = []
+    for i in range(200000):
+        values.append(enums[i % len(enums)])
+        values.append(str(i))
+        values.append("{}.{}".format(i, i % 7))
+        values.append("Lorem ipsum dolor sit amet {}".format(i % 100))
+
+    def run_reference():
+        for value in values:
+            get_type_reference(value.lower())
+
+    def run_new():
+        for value in values:
+            xtd.get_type(value)
+
+    report("get_type puvodni ({} hodnot)".format(len(values)), measure(run_reference))
+    report("get_type novy ({} hodnot)".format(len(values)), measure(run_new))
+
+# Škálování výpočtu tranzitivních relací (-g) na syntetických schématech se
+# 100, 1000 a 5000 tabulkami ve skupinách po 50 tabulkách a na schématech
+# tvořených jedinou souvislou skupinou. Původní výpočet se měří jen tam, kde
+# doběhne v rozumném čase.
+def bench_transit():
+    """skalovani vypoctu tranzitivnich relaci"""
+
+    sys.setrecursionlimit(10000)
+    cases = ((100, 50, True), (1000, 50, True), (5000, 50, False),
+             (100, 100, True), (1000, 1000, False))
+    for tables, component, reference in cases:
+        work_dict = gen_schema(tables, component)
+        name = "{} tabulek, skupiny po {}".format(tables, component)
+        if reference:
+            report("transit puvodni - " + name, measure(
+                lambda: transit_reference(*relations_reference(work_dict)), 1))
+        report("transit novy - " + name, measure(
+            lambda: xtd.transit(*xtd.relations(work_dict)[1:]), 1))
+
+# Normalizace schématu (--etc, přejmenování cizích klíčů a kontrola kolizí
+# jmen) pro tabulky s tisíci sloupci a cizími klíči, původní postup oproti
+# xtd.schema_normalize(), včetně kontroly shody výsledků. Každé spuštění
+# pracuje s vlastní kopií slovníku tabulek připravenou předem.
+def bench_normalize():
+    """normalizace schematu sirokych tabulek"""
+
+    for tables, columns, fkeys in ((10, 2000, 500), (5, 5000, 2000), (20, 10000, 5000)):
+        dump = xtd.work_dump(gen_wide_schema(tables, columns, fkeys))
+        name = "{} tabulek, {} sloupcu, {} cizich klicu".format(tables, columns, fkeys)
+        results = {}
+        variants = [("nova", lambda work_dict: xtd.schema_normalize(work_dict, 2, False))]
+        if columns * fkeys <= 10 ** 7:
+            variants.insert(0, ("puvodni", lambda work_dict: normalize_reference(work_dict, 2)))
+        for label, func in variants:
+            copies = [xtd.work_load(dump) for _ in range(3)]
+
+            def run():
+                work_dict = copies.pop()
+                func(work_dict)
+                results[label] = xtd.work_dump(work_dict)
+
+            report("normalizace {} - {}".format(label, name), measure(run))
+
+        if len(results) > 1 and results["puvodni"] != results["nova"]:
+            sys.stderr.write("ERROR:vysledky normalizace se lisi\n")
+            sys.exit(1)
+
+# Přejmenování cizích klíčů tabulky s podelementem opakovaným count krát
+# a s taken již existujícími kolidujícími jmény (item1, item3, ...), původní
+# a nové přidělování jmen, výpis DDL a výpis DDL s parametrem --fkey-cap.
+def bench_names():
+    """prejmenovani opakovanych cizich klicu"""
+
+    args = argparse.Namespace(header=[], buffer=xtd.OUTPUT_BUFFER)
+    for count, taken in ((5000, 0), (5000, 2500), (100000, 50000)):
+        table = xtd.TableElement("list")
+        table.givefkey("item", count)
+        for i in range(taken):
+            table.givefkey("item%d" % (2 * i + 1), 1)
+        fkey = table.fkey
+        name = "{} opakovani, {} kolizi".format(count, taken)
+
+        report("jmena puvodni - " + name, measure(lambda: name_alloc_reference(fkey)))
+        if name_alloc_reference(fkey) != xtd.name_alloc(fkey):
+            sys.stderr.write("ERROR:prejmenovani cizich klicu se lisi\n")
+            sys.exit(1)
+        report("jmena nova - " + name, measure(lambda: xtd.name_alloc(fkey)))
+
+        for label, cap in (("", None), (" --fkey-cap=100", 100)):
+            def run():
+                work_dict = {"list": xtd.TableElement("list")}
+                work_dict["list"].fkey = dict(fkey)
+                for key in fkey:
+                    work_dict[key] = xtd.TableElement(key)
+                xtd.schema_normalize(work_dict, None, False, cap)
+                xtd.print_ddl(io.StringIO(), args, "", work_dict)
+
+            report("normalizace a DDL{} - {}".format(label, name), measure(run))
+
+def peak_memory(func):
+    """vraci spicku alokovane pameti (v MiB) behem volani funkce func"""
+
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1] / (1 << 20)
+    finally:
+        tracemalloc.stop()
+
+def report_memory(name, mib):
+    """vytiskne jeden radek vysledku mereni pameti"""
+
+    record(name=name, peak_mib=mib)
+    sys.stdout.write("{:<50} {:>10.1f} MiB\n".format(name, mib))
+
+# Paměťová náročnost uložení relací pro '-g', původní slovník slovníků oproti
+# matici bajtů a polím čísel tabulek.
+def bench_transit_memory():
+    """spicka pameti pri vypoctu tranzitivnich relaci"""
+
+    sys.setrecursionlimit(10000)
+    for tables, component in ((1000, 50), (2000, 100)):
+        work_dict = gen_schema(tables, component)
+        name = "{} tabulek, skupiny po {}".format(tables, component)
+        report_memory("relace puvodni - " + name, peak_memory(
+            lambda: transit_reference(*relations_reference(work_dict))))
+        report_memory("relace nove - " + name, peak_memory(
+            lambda: xtd.transit(*xtd.relations(work_dict)[1:])))
+
+# Nahrávání do SQLite (--sqlite) na vygenerovaném dokumentu s 1 000 000
+# elementů: odvození schématu a nahrání dat, vkládání po dávkách pomocí
+# executemany() oproti vkládání po jednotlivých řádcích pomocí execute().
+class RowWriter(xtd.SqliteWriter):
+    """vkladani po jednotlivych radcich pomoci execute()"""
+    def add(self, table, row):
+        self.conn.execute("INSERT INTO " + xtd.sqlite_name(table.name) + " VALUES ("
+                          + ", ".join("?" * len(row)) + ")", row)
+
+def load_sqlite(path, database, writer, batch=xtd.DATA_BATCH):
+    """odvodi schema vstupu a nahraje jeho data do databaze, vraci pocet radku"""
+
+    args = argparse.Namespace(a=0, b=0, batch=batch)
+    work_dict = {}
+    with open(path, "r") as istream:
+        xtd.do_xml_stream(istream, 0, work_dict)
+    old = xtd.name_check(work_dict)
+    tables = xtd.data_tables(work_dict, old, args, "")
+    if os.path.exists(database):
+        os.remove(database)
+    out = writer(database, tables, batch)
+    ids = {}
+    with open(path, "r") as istream:
+        for tag, row in xtd.data_rows(istream, args, tables, ids, xtd.sqlite_value):
+            out.add(tables[tag], row)
+    out.close()
+    return sum(ids.values())
+
+def bench_sqlite():
+    """rychlost nahravani dat do SQLite"""
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "vstup.xml")
+        database = os.path.join(directory, "data.db")
+        with open(path, "w") as data:
+            data.write(gen_wide(250000))
+
+        for label, writer in (("executemany", xtd.SqliteWriter),
+                              ("execute po radcich", RowWriter)):
+            rows = []
+            seconds = measure(lambda: rows.append(load_sqlite(path, database, writer)), 1)
+            report("sqlite {} ({} radku)".format(label, rows[0]), seconds)
+            sys.stdout.write("{:<50} {:>10.0f} radku/s\n".format(
+                "sqlite " + label, rows[0] / seconds))
+            record(name="sqlite " + label, rows_per_second=rows[0] / seconds)
+
+# Jednotlivé fáze zpracování (stejně jako v xtd.main()) na syntetických
+# dokumentech, pro každou fázi se měří nejlepší čas z několika běhů
+# a špička alokované paměti během fáze.
+#   (název, width, depth, tags, repeat, attrs, namespace, etc)
+STAGE_CASES = [
+    ("siroky", 20000, 2, 10, 3, 3, False, None),
+    ("hluboky", 100, 300, 20, 1, 1, False, None),
+    ("mnoho tagu", 5000, 3, 300, 2, 2, False, None),
+    ("opakovani", 2000, 2, 5, 20, 1, False, 10),
+    ("jmenny prostor", 20000, 2, 10, 3, 3, True, None),
+]
+
+def run_stages(data, etc, clock):
+    """spusti vsechny faze zpracovani dokumentu, clock(faze, funkce) meri
+    jednotlive faze"""
+
+    args = argparse.Namespace(header=[], buffer=xtd.OUTPUT_BUFFER)
+    work_dict = {}
+    root_tag = clock("do_xml", lambda: xtd.do_xml_stream(io.BytesIO(data), 0, work_dict))
+    namespace = root_tag[:root_tag.find("}") + 1] if root_tag[0] == "{" else ""
+    old = clock("normalize", lambda: xtd.schema_normalize(work_dict, etc, False))
+    clock("print_ddl", lambda: xtd.print_ddl(io.StringIO(), args, namespace, work_dict))
+    xtd.name_restore(work_dict, old)
+    clock("print_g", lambda: xtd.print_g(io.StringIO(), args, namespace, work_dict))
+
+def bench_stages(cases=None, repeat=3):
+    """casy a spicky pameti jednotlivych fazi zpracovani"""
+
+    for case in cases or STAGE_CASES:
+        label, etc = case[0], case[7]
+        data = gen_xml(*case[1:7]).encode()
+        times = {}
+
+        def timed(stage, func):
+            start = time.perf_counter()
+            result = func()
+            elapsed = time.perf_counter() - start
+            times[stage] = min(elapsed, times.get(stage, elapsed))
+            return result
+
+        for _ in range(repeat):
+            run_stages(data, etc, timed)
+
+        peaks = {}
+
+        def traced(stage, func):
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            result = func()
+            peaks[stage] = (tracemalloc.get_traced_memory()[1] - before) / (1 << 20)
+            return result
+
+        tracemalloc.start()
+        try:
+            run_stages(data, etc, traced)
+        finally:
+            tracemalloc.stop()
+
+        params = dict(zip(("width", "depth", "tags", "repeat", "attrs", "namespace"),
+                          case[1:7]), etc=etc, size=len(data))
+        for stage in times:
+            name = "{} - {}".format(stage, label)
+            RESULTS.append(dict(benchmark=CURRENT[0], name=name, case=label,
+                                stage=stage, seconds=times[stage],
+                                peak_mib=peaks[stage], params=params))
+            sys.stdout.write("{:<50} {:>10.4f} s {:>8.1f} MiB\n".format(
+                name, times[stage], peaks[stage]))
+
+# Propustnost proudové analýzy (do_xml_stream) velkých dokumentů pro každý
+# dostupný backend parseru, včetně kontroly shody výsledných tabulek, na
+# dokumentu s hustým značkováním a na dokumentu s delšími texty.
+def gen_text(width, length):
+    """dokument s width elementy s textem delky length"""
+
+    text = ("lorem ipsum " * length)[:length]
+    return ("<root>" + "".join('<Item id="%d">%s</Item>' % (i, text) for i in range(width))
+            + "</root>")
+
+def bench_parser():
+    """propustnost backendu parseru XML"""
+
+    documents = (("znackovani", lambda: gen_xml(100000, 3, 50, 3, 3)),
+                 ("text", lambda: gen_text(50000, 1000)))
+    saved = xtd.PARSER_BACKEND
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "vstup.xml")
+            for label, generate in documents:
+                with open(path, "w") as data:
+                    data.write(generate())
+                size = os.path.getsize(path) / (1 << 20)
+                results = {}
+
+                def run(backend):
+                    xtd.parser_select(backend)
+                    work_dict = {}
+                    with open(path, "r") as istream:
+                        xtd.do_xml_stream(istream, 0, work_dict)
+                    results[backend] = xtd.work_dump(work_dict)
+
+                for backend in ("etree", "lxml"):
+                    name = "parser {} - {} ({:.0f} MiB)".format(backend, label, size)
+                    if backend == "lxml" and xtd.lxml_etree is None:
+                        report(name + " nedostupny", None)
+                        continue
+                    seconds = measure(lambda: run(backend))
+                    report(name, seconds)
+                    sys.stdout.write("{:<50} {:>10.1f} MiB/s\n".format(
+                        "parser {} - {}".format(backend, label), size / seconds))
+                    record(name="parser {} - {}".format(backend, label),
+                           mib_per_second=size / seconds)
+
+                if len(results) > 1 and results["etree"] != results["lxml"]:
+                    sys.stderr.write("ERROR:vysledky backendu parseru se lisi\n")
+                    sys.exit(1)
+    finally:
+        xtd.parser_select(saved)
+
+
+# Paměť slovníku tabulek a čas odvození schématu pro dokumenty s mnoha
+# různými tabulkami, původní třída tabulky oproti xtd.TableElement
+# (__slots__, typy sloupců zůstávají ve slovníku). Měří se paměť, která zůstane
+# alokována po odvození (slovník tabulek a jména).
+def bench_tables():
+    """pamet a cas odvozeni schematu dle tridy tabulky"""
+
+    saved = xtd.TableElement
+    try:
+        for tags, attrs in ((20000, 5), (50000, 2)):
+            data = gen_xml(tags // 2, 3, tags, 1, attrs).encode()
+            name = "{} tabulek, {} atributu".format(tags, attrs)
+            for label, table_class in (("puvodni", TableElementReference),
+                                       ("nova", saved)):
+                xtd.TableElement = table_class
+
+                def run():
+                    xtd.NAMES.clear()
+                    work_dict = {}
+                    xtd.do_xml_stream(io.BytesIO(data), 0, work_dict)
+                    return work_dict
+
+                report("tabulky {} - {}".format(label, name), measure(run))
+                tracemalloc.start()
+                try:
+                    work_dict = run()
+                    retained = tracemalloc.get_traced_memory()[0] / (1 << 20)
+                finally:
+                    tracemalloc.stop()
+                del work_dict
+                report_memory("tabulky {} - {}".format(label, name), retained)
+    finally:
+        xtd.TableElement = saved
+
+
+# Škálování parametru --jobs: sekvenční proudová analýza, samotné dělení
+# vstupu hlavním procesem (XmlSplitter), které omezuje dosažitelné zrychlení
+# na poměr sekvenčního času a času dělení, a do_xml_parallel() pro 1 až N
+# procesů (N = počet procesorů, nejméně 2), včetně kontroly shody výsledků.
+def bench_parallel():
+    """skalovani paralelni analyzy dle poctu procesu"""
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "vstup.xml")
+        with open(path, "w") as data:
+            data.write(gen_xml(60000, 3, 50, 3, 3))
+        size = os.path.getsize(path) / (1 << 20)
+        name = "({:.0f} MiB)".format(size)
+        results = {}
+
+        def run(jobs):
+            work_dict = {}
+            with open(path, "rb") as istream:
+                if jobs == 0:
+                    xtd.do_xml_stream(istream, 0, work_dict)
+                else:
+                    xtd.do_xml_parallel(istream, 0, work_dict, jobs)
+            results[jobs] = xtd.work_dump(work_dict)
+
+        def split():
+            with open(path, "rb") as istream:
+                for _ in xtd.XmlSplitter(istream):
+                    pass
+
+        sequential = measure(lambda: run(0))
+        report("sekvencne " + name, sequential)
+        splitter = measure(split)
+        report("deleni vstupu " + name, splitter)
+        sys.stdout.write("{:<50} {:>10.1f} MiB/s\n".format("deleni vstupu", size / splitter))
+        sys.stdout.write("{:<50} {:>10.1f} x\n".format("nejvyssi zrychleni", sequential / splitter))
+        record(name="nejvyssi zrychleni", speedup=sequential / splitter)
+        for jobs in range(1, max(2, os.cpu_count() or 1) + 1):
+            seconds = measure(lambda: run(jobs))
+            report("--jobs={} {}".format(jobs, name), seconds)
+            sys.stdout.write("{:<50} {:>10.2f} x\n".format(
+                "zrychleni --jobs={}".format(jobs), sequential / seconds))
+            record(name="zrychleni --jobs={}".format(jobs), speedup=sequential / seconds)
+            if results[jobs] != results[0]:
+                sys.stderr.write("ERROR:vysledky paralelni analyzy se lisi\n")
+                sys.exit(1)
+
+
+BENCHMARKS = {
+    "walker": bench_walker,
+    "get_type": bench_get_type,
+    "transit": bench_transit,
+    "transit_memory": bench_transit_memory,
+    "sqlite": bench_sqlite,
+    "stages": bench_stages,
+    "parser": bench_parser,
+    "tables": bench_tables,
+    "normalize": bench_normalize,
+    "names": bench_names,
+    "parallel": bench_parallel,
+}
+
+def main():
+    params = argparse.ArgumentParser()
+    params.add_argument("names", nargs="*", help="nazvy mereni")
+    params.add_argument("--json", help="soubor pro ulozeni vysledku")
+    params.add_argument("--width", type=int, help="pocet zaznamu dokumentu")
+    params.add_argument("--depth", type=int, default=2, help="hloubka zaznamu")
+    params.add_argument("--tags", type=int, default=10, help="pocet ruznych elementu")
+    params.add_argument("--repeat", type=int, default=1,
+                        help="pocet stejnojmennych sourozencu")
+    params.add_argument("--attrs", type=int, default=2, help="pocet atributu elementu")
+    params.add_argument("--namespace", action="store_true",
+                        help="vychozi jmenny prostor dokumentu")
+    params.add_argument("--etc", type=int, help="parametr --etc")
+    args = params.parse_args()
+
+    names = args.names or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            sys.stderr.write("ERROR:Nezname mereni: " + name + "\n")
+            sys.exit(1)
+    for name in names:
+        CURRENT[0] = name
+        if name == "stages" and args.width is not None:
+            bench_stages([("vlastni", args.width, args.depth, args.tags, args.repeat,
+                           args.attrs, args.namespace, args.etc)])
+        else:
+            BENCHMARKS[name]()
+
+    if args.json is not None:
+        with open(args.json, "w") as data:
+            json.dump({"created": datetime.datetime.now().isoformat(timespec="seconds"),
+                       "python": platform.python_version(),
+                       "platform": platform.platform(),
+                       "results": RESULTS}, data, indent=2)
+            data.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Regresní testy chování xtd.py z příkazové řádky.
+# Spuštění: python3 -m pytest tests  nebo  python3 -m unittest discover tests
+
+import argparse
+import importlib.util
+import io
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+XTD = os.path.join(ROOT, "xtd.py")
+sys.path.insert(0, ROOT)
+
+import xtd
+
+
+class XtdTestCase(unittest.TestCase):
+    """spousteni xtd.py nad soubory v docasnem adresari"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def path(self, name):
+        """vraci cestu k souboru v docasnem adresari"""
+
+        return os.path.join(self.directory.name, name)
+
+    def write(self, name, data):
+        """vytvori soubor v docasnem adresari, vraci jeho cestu"""
+
+        with open(self.path(name), "w", encoding="utf-8") as output:
+            output.write(data)
+        return self.path(name)
+
+    def xtd(self, *args):
+        """spusti xtd.py, vraci (navratova hodnota, vystup)"""
+
+        process = subprocess.run([sys.executable, XTD] + list(args),
+                                 stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                 universal_newlines=True)
+        return process.returncode, process.stdout
+
+
+# Validace (--isvalid) se provádí proudově: každý element souboru pro validaci
+# musí odpovídat existující tabulce (neznámá tabulka -> 91), tabulky, které
+# soubor pro validaci neobsahuje, jsou povoleny. Podelementy se ověřují proti
+# jménům cizích klíčů dle jejich četnosti (author1 ... authorN, bez čísla při
+# četnosti jedna, s parametrem -b vždy bez čísla).
+class IsValidTest(XtdTestCase):
+    """semantika parametru --isvalid"""
+
+    INPUT = ('<lib><book id="1"><author>A</author><author>B</author>'
+             '<author>C</author></book><shelf/></lib>')
+
+    def isvalid(self, data, *args):
+        """vraci navratovou hodnotu validace data proti INPUT"""
+
+        source = self.write("vstup.xml", self.INPUT)
+        valid = self.write("valid.xml", data)
+        return self.xtd("--input=" + source, "--isvalid=" + valid, *args)[0]
+
+    def test_subset(self):
+        data = '<lib><book id="1"><author>X</author><author>Y</author></book></lib>'
+        self.assertEqual(self.isvalid(data), 0)
+        self.assertEqual(self.isvalid(data, "-b"), 0)
+
+    def test_missing_tables(self):
+        self.assertEqual(self.isvalid('<lib><shelf/></lib>'), 0)
+        self.assertEqual(self.isvalid('<lib/>'), 0)
+
+    def test_unknown_table(self):
+        self.assertEqual(self.isvalid('<lib><book id="1"/><other/></lib>'), 91)
+        self.assertEqual(self.isvalid('<lib><book id="1"/><other/></lib>', "-b"), 91)
+
+    def test_suffixed_names(self):
+        # author1 ... author3 existují, author4 ne
+        data = "<lib><book>" + "<author>X</author>" * 3 + "</book></lib>"
+        self.assertEqual(self.isvalid(data), 0)
+        data = "<lib><book>" + "<author>X</author>" * 4 + "</book></lib>"
+        self.assertEqual(self.isvalid(data), 91)
+        self.assertEqual(self.isvalid(data, "-b"), 0)
+
+    def test_bare_name(self):
+        # jméno author bez čísla se ověřuje až na konci souboru
+        single = "<book><author>X</author></book>"
+        self.assertEqual(self.isvalid("<lib>" + single + "</lib>"), 91)
+        self.assertEqual(self.isvalid("<lib>" + single + "</lib>", "-b"), 0)
+        data = "<lib>" + single + "<book><author>X</author><author>Y</author></book></lib>"
+        self.assertEqual(self.isvalid(data), 0)
+
+    def test_higher_type(self):
+        self.assertEqual(self.isvalid('<lib><book id="abc"/></lib>'), 91)
+        self.assertEqual(self.isvalid('<lib><shelf x="1"/></lib>'), 91)
+
+    def test_invalid_xml(self):
+        self.assertEqual(self.isvalid('<lib><book>'), 4)
+
+    def test_trailing_content(self):
+        self.assertEqual(self.isvalid('<lib><book id="1"/></lib><junk/>'), 4)
+        self.assertEqual(self.isvalid('<lib/>garbage', "-b"), 4)
+
+    def test_serve_trailing_content(self):
+        source = self.write("vstup.xml", self.INPUT)
+        requests = ('{"id": 1, "data": "<lib><book id=\\"1\\"/></lib>"}\n'
+                    '{"id": 2, "data": "<lib><book id=\\"1\\"/></lib><junk/>"}\n')
+        process = subprocess.run([sys.executable, XTD, "--input=" + source, "--serve"],
+                                 input=requests, stdout=subprocess.PIPE,
+                                 universal_newlines=True)
+        answers = {answer["id"]: answer for answer in map(json.loads, process.stdout.splitlines())}
+        self.assertTrue(answers[1]["valid"])
+        self.assertFalse(answers[2]["valid"])
+        self.assertEqual(answers[2]["code"], 4)
+
+
+# Export dat (--data=insert) zapisuje číselné hodnoty v kanonickém tvaru,
+# nekonečno a NaN jako NULL, výstup tedy lze nahrát do SQLite.
+class DataInsertTest(XtdTestCase):
+    """literaly SQL exportu dat"""
+
+    def test_numeric_literals(self):
+        source = self.write("vstup.xml", '<r><x v="1_000" f="inf" g="nan" h="\u0663"/>'
+                                         '<x v="7" f="1e3" g="true" h="-0"/></r>')
+        code, output = self.xtd("--input=" + source, "--data=insert")
+        self.assertEqual(code, 0)
+        self.assertIn("(1, 1000, NULL, NULL, 3),\n  (2, 7, 1000.0, 1, 0);", output)
+        database = sqlite3.connect(":memory:")
+        self.addCleanup(database.close)
+        database.executescript(output.replace("NTEXT", "TEXT").replace("NVARCHAR", "TEXT"))
+        self.assertEqual(database.execute("SELECT v, h FROM x").fetchall(), [(1000, 3), (7, 0)])
+
+
+# Chyby parseru v pracovních procesech (--jobs, --cache) končí návratovou
+# hodnotou 4 pro každý backend parseru.
+class WorkerErrorTest(XtdTestCase):
+    """chyby vstupu zpracovavaneho v pracovnich procesech"""
+
+    def test_invalid_file(self):
+        os.mkdir(self.path("vstup"))
+        self.write(os.path.join("vstup", "a.xml"), "<root><a>1</a></root>")
+        self.write(os.path.join("vstup", "b.xml"), "<root><a>")
+        parsers = ("etree", "lxml") if importlib.util.find_spec("lxml") else ("etree",)
+        for parser in parsers:
+            for extra in ([], ["--cache=" + self.path("cache-" + parser)]):
+                code = self.xtd("--input=" + self.path("vstup"), "--jobs=2",
+                                "--parser=" + parser, *extra)[0]
+                self.assertEqual(code, 4, (parser, extra))
+
+
+# SchemaInferrer nemění stav modulu: backend parseru a jména převedená na malá
+# písmena patří instanci.
+class SchemaInferrerTest(unittest.TestCase):
+    """izolace instanci SchemaInferrer"""
+
+    def test_isolation(self):
+        backend = xtd.PARSER_BACKEND
+        names = len(xtd.NAMES)
+        parser = "lxml" if xtd.lxml_etree is not None else "etree"
+        inferrer = xtd.SchemaInferrer(parser=parser)
+        inferrer.feed('<Root><Book ID="1"><Author>A</Author></Book></Root>')
+        self.assertEqual(inferrer.backend, parser)
+        self.assertEqual(xtd.PARSER_BACKEND, backend)
+        self.assertEqual(len(xtd.NAMES), names)
+        self.assertIn("CREATE TABLE book(", inferrer.ddl())
+        self.assertEqual(inferrer.relations()[0][0], "book")
+
+    def test_auto(self):
+        backend = xtd.PARSER_BACKEND
+        text = b"<r><a>" + b"lorem ipsum " * 100 + b"</a></r>"
+        dense = b"<r>" + b'<a x="1"/>' * 100 + b"</r>"
+        lxml = "lxml" if xtd.lxml_etree is not None else "etree"
+        for data, expected in ((text, lxml), (io.BytesIO(text), lxml), (dense, "etree"),
+                               (text.decode(), "etree")):
+            with self.subTest(data=data):
+                inferrer = xtd.SchemaInferrer(parser="auto")
+                inferrer.feed(data)
+                self.assertEqual(inferrer.backend, expected)
+                # backend se volí jen podle prvního dokumentu
+                inferrer.feed(dense if expected == lxml else text)
+                self.assertEqual(inferrer.backend, expected)
+                self.assertEqual(inferrer.args.backend, expected)
+        self.assertEqual(xtd.PARSER_BACKEND, backend)
+
+    def test_relations(self):
+        inferrer = xtd.SchemaInferrer()
+        inferrer.feed("<r><a><b/><b/></a></r>")
+        self.assertIn("b1_id INT", inferrer.ddl())
+        self.assertEqual(dict(inferrer.relations())["a"], [("a", "1:1"), ("b", "N:1")])
+        self.assertIn('<relation to="b" relation_type="N:1" />', inferrer.render(g=1))
+        self.assertIn("b1_id INT", inferrer.ddl())
+
+
+# Předchozí schéma (--diff) lze zadat jako DDL i jako soubor uložený
+# parametrem --save-schema, oba tvary popisují stejné tabulky.
+class SchemaDiffTest(XtdTestCase):
+    """nacteni, ulozeni a rozdil schematu"""
+
+    OLD = '<r><book id="1"><author>A</author></book></r>'
+    NEW = ('<r><book id="1" title="X"><author>A</author><author>B</author></book>'
+           '<shelf/></r>')
+
+    def test_parse(self):
+        schema = xtd.schema_parse("CREATE TABLE book(\n  prk_book_id INT PRIMARY KEY,\n"
+                                  "  author_id INT,\n  title NVARCHAR\n);\n"
+                                  "ALTER TABLE book ADD year INT;\n"
+                                  "ALTER TABLE book ALTER COLUMN title NTEXT;\n")
+        self.assertEqual(schema, {"book": {"author_id": xtd.INT, "title": xtd.NTEXT,
+                                           "year": xtd.INT}})
+        with self.assertRaises(xtd.XtdFormatError):
+            xtd.schema_parse("CREATE TABLE book(\n  title TEXTX\n);")
+
+    def test_round_trip(self):
+        source = self.write("vstup.xml", self.NEW)
+        code, ddl = self.xtd("--input=" + source, "--save-schema=" + self.path("s.json"))
+        self.assertEqual(code, 0)
+        self.assertEqual(xtd.schema_parse(ddl), xtd.schema_load(self.path("s.json")))
+        self.assertEqual(self.xtd("--input=" + source, "--diff=" + self.path("s.json")),
+                         (0, ""))
+        self.write("s.ddl", ddl)
+        self.assertEqual(self.xtd("--input=" + source, "--diff=" + self.path("s.ddl")),
+                         (0, ""))
+
+    def test_diff_and_save_same_file(self):
+        schema = "--save-schema=" + self.path("s.json")
+        old = self.write("old.xml", self.OLD)
+        new = self.write("new.xml", self.NEW)
+        self.assertEqual(self.xtd("--input=" + old, schema)[0], 0)
+        code, output = self.xtd("--input=" + new, "--diff=" + self.path("s.json"), schema)
+        self.assertEqual(code, 0)
+        self.assertIn("ALTER TABLE book ADD title", output)
+        self.assertIn("CREATE TABLE shelf(", output)
+        # uložené schéma odpovídá novému vstupu
+        self.assertEqual(self.xtd("--input=" + new, "--diff=" + self.path("s.json")), (0, ""))
+
+
+# Obsah za kořenovým elementem je chybou vstupu (4) pro každý způsob
+# zpracování vstupu.
+class TrailingContentTest(XtdTestCase):
+    """obsah za korenovym elementem"""
+
+    def test_junk(self):
+        parsers = ("etree", "lxml") if importlib.util.find_spec("lxml") else ("etree",)
+        for data in ("<r/><junk>", '<r><a x="1"/></r><junk>', "<r/><r2/>", "<r/>garbage"):
+            source = self.write("vstup.xml", data)
+            for parser in parsers:
+                for extra in ([], ["--jobs=2"], ["--cache=" + self.path("cache")]):
+                    code = self.xtd("--input=" + source, "--parser=" + parser, *extra)[0]
+                    self.assertEqual(code, 4, (data, parser, extra))
+            with self.assertRaises(xtd.XtdFormatError):
+                xtd.SchemaInferrer().feed(data)
+
+    def test_data(self):
+        source = self.write("vstup.xml", '<r><x a="1"/></r><junk/>')
+        self.assertEqual(self.xtd("--input=" + source, "--data=insert")[0], 4)
+        self.assertEqual(self.xtd("--input=" + source, "--sqlite=" + self.path("db"))[0], 4)
+
+        # druhý průchod vstupem (export dat) kontroluje vstup samostatně
+        work_dict = {}
+        xtd.do_xml_stream(io.BytesIO(b'<r><x a="1"/></r>'), 0, work_dict)
+        args = argparse.Namespace(a=0, b=0, etc=None)
+        tables = xtd.data_tables(work_dict, xtd.schema_normalize(work_dict, None, 0), args, "")
+        rows = xtd.data_rows(io.BytesIO(b'<r><x a="1"/></r><junk/>'), args, tables, {})
+        with self.assertRaises(xtd.PARSE_ERRORS):
+            list(rows)
+
+    def test_sample(self):
+        parsers = ("etree", "lxml") if importlib.util.find_spec("lxml") else ("etree",)
+        for data in ("<r/><junk>", '<r><a x="1"/></r><junk>'):
+            source = self.write("vstup.xml", data)
+            for parser in parsers:
+                for sample in ("5", "0.5", "reservoir:2"):
+                    code = self.xtd("--input=" + source, "--parser=" + parser,
+                                    "--sample=" + sample)[0]
+                    self.assertEqual(code, 4, (data, parser, sample))
+
+        # prvních n záznamů: zbytek vstupu se nečte
+        source = self.write("vstup.xml", "<r><a/><a/></r><junk>")
+        self.assertEqual(self.xtd("--input=" + source, "--sample=1")[0], 0)
+
+    def test_trailing_misc(self):
+        source = self.write("vstup.xml", "<r><a/></r>\n<!-- konec --><?pi x?>\n")
+        self.assertEqual(self.xtd("--input=" + source)[0], 0)
+        self.assertEqual(self.xtd("--input=" + source, "--jobs=2")[0], 0)
+
+
+# Paralelní analýza (--jobs) dělí vstup na dávky elementů nejvyšší úrovně
+# (XmlSplitter), výsledek musí být totožný se sekvenční analýzou i při
+# dělení po několika bajtech a konstrukcích, ve kterých počet značek
+# neurčuje hloubku zanoření.
+class XmlSplitterTest(unittest.TestCase):
+    """deleni vstupu pro parametr --jobs"""
+
+    DOCUMENT = (
+        '<?xml version="1.0"?>\r\n<!DOCTYPE r [<!ENTITY e "x>y">]>\r\n'
+        '<!-- <r> --><r xmlns:n="urn:n">text<a x="1/>" y=\'a>b\'>t/>x</a>\r\n'
+        '<b/><!-- <c> </c> --><c><![CDATA[</c><d/>]]><e>1</e></c>'
+        '<?pi <a/> ?><n:d q="&e;"><e/><e/></n:d>tail<b>2.5</b>'
+        + "".join('<f i="%d"><g>%d</g><g/></f>' % (i, i) for i in range(50))
+        + '</r>\r\n<!-- konec -->')
+
+    def analyze(self, jobs):
+        work_dict = {}
+        stream = io.BytesIO(self.DOCUMENT.encode())
+        if jobs == 1:
+            tag = xtd.do_xml_stream(stream, 0, work_dict)
+        else:
+            tag = xtd.do_xml_parallel(stream, 0, work_dict, jobs)
+        return tag, xtd.work_dump(work_dict)
+
+    def test_parity(self):
+        expected = self.analyze(1)
+        for size in (1, 7, 64, 1 << 20):
+            with mock.patch.object(xtd, "JOB_BYTES", size), \
+                    mock.patch.object(xtd, "JOB_BLOCK", 16):
+                self.assertEqual(self.analyze(2), expected, size)
+
+    def test_truncated(self):
+        data = self.DOCUMENT.encode()
+        for end in (len(data) // 2, data.index(b"</r>") + 2):
+            with mock.patch.object(xtd, "JOB_BYTES", 7):
+                with self.assertRaises(xtd.PARSE_ERRORS + (xtd.XtdFormatError,)):
+                    xtd.do_xml_parallel(io.BytesIO(data[:end]), 0, {}, 2)
+
+
+# Statistiky (--stats-file) obsahují jednotlivé fáze zpracování a čítače.
+class StatsTest(XtdTestCase):
+    """statistiky zpracovani"""
+
+    def stats(self, *args):
+        source = self.write("vstup.xml", "<r><a x=\"1\"><b/><b/></a><a/></r>")
+        code = self.xtd("--input=" + source, "--stats-file=" + self.path("s.json"), *args)[0]
+        self.assertEqual(code, 0)
+        with open(self.path("s.json")) as data:
+            return json.load(data)
+
+    def test_stages(self):
+        stats = self.stats("--etc=1")
+        self.assertEqual([stage["stage"] for stage in stats["stages"]],
+                         ["do_xml", "etc", "name_check", "inspect", "print_ddl"])
+        self.assertEqual(stats["counters"]["elements"], 5)
+        self.assertEqual(stats["counters"]["tables"], 2)
+        stats = self.stats("-g")
+        self.assertEqual([stage["stage"] for stage in stats["stages"]][-2:],
+                         ["transit", "print_g"])
+        self.assertGreater(stats["counters"]["transit_passes"], 0)
+
+
+
+# libxml2 (lxml) odmítá dokumenty hlubší než 2048 úrovní, analýza se
+# v takovém případě zopakuje pomocí ElementTree.
+class DeepDocumentTest(XtdTestCase):
+    """dokument hlubsi nez limit lxml"""
+
+    DEPTH = 3000
+
+    def setUp(self):
+        super().setUp()
+        self.write("deep.xml", "<r>" + "<a x=\"1\">" * self.DEPTH + "t"
+                   + "</a>" * self.DEPTH + "</r>")
+
+    def test_parsers(self):
+        code, expected = self.xtd("--input=" + self.path("deep.xml"), "--parser=etree")
+        self.assertEqual(code, 0)
+        self.assertIn("CREATE TABLE a(", expected)
+        options = [["--parser=auto"]]
+        if xtd.lxml_etree is not None:
+            options += [["--parser=lxml"], ["--parser=lxml", "--jobs=2"],
+                        ["--parser=lxml", "--isvalid=" + self.path("deep.xml")]]
+        for option in options:
+            with self.subTest(option=option):
+                self.assertEqual(self.xtd("--input=" + self.path("deep.xml"), *option),
+                                 (0, expected))
+
+    def test_data(self):
+        parsers = ["etree"] + (["lxml"] if xtd.lxml_etree is not None else [])
+        outputs = [self.xtd("--input=" + self.path("deep.xml"), "--parser=" + parser,
+                            "--data=insert") for parser in parsers]
+        self.assertEqual(outputs[0][0], 0)
+        self.assertEqual(outputs.count(outputs[0]), len(outputs))
+
+    def test_auto_sample(self):
+        sample = b"<r>" + b"<a>" * self.DEPTH
+        self.assertEqual(xtd.parser_choose("auto", sample), "etree")
+        self.assertEqual(xtd.parser_choose("auto", b"<r><a>" + b"x" * 4096), "etree")
+
+    @unittest.skipIf(xtd.lxml_etree is None, "lxml neni k dispozici")
+    def test_inferrer(self):
+        with open(self.path("deep.xml"), "rb") as istream:
+            data = istream.read()
+        inferrer = xtd.SchemaInferrer(parser="lxml")
+        inferrer.feed(data)
+        self.assertEqual(inferrer.backend, "lxml")
+        reference = xtd.SchemaInferrer(parser="etree")
+        reference.feed(data)
+        self.assertEqual(inferrer.ddl(), reference.ddl())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,9 +2,54 @@
 # -*- coding: utf-8 -*-
 
 import argparse
+import array
+import atexit
+import bz2
+import codecs
+import collections
+import concurrent.futures
+import contextlib
+import csv
+import functools
+import glob
+import gzip
+import hashlib
+import io
+import itertools
+import json
+import lzma
+import math
+import mmap
+import operator
+import os
+import random
+import re
+import signal
+import socketserver
+import sqlite3
 import sys
-import copy
+import threading
+import time
 import xml.etree.ElementTree as ET
+import xml.parsers.expat
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+try:
+    import lxml.etree as lxml_etree
+except ImportError:
+    lxml_etree = None
+
+try:
+    from compression import zstd
+except ImportError:
+    try:
+        import zstandard as zstd
+    except ImportError:
+        zstd = None
 
 
 # Pro snadnější čitelnost kódu:
@@ -15,6 +60,9 @@ STR = 4
 NVARCHAR = 5
 NTEXT = 6
 
+# sdílený prázdný čítač potomků pro listové elementy
+NO_CHILDREN = ()
+
 
 def print_err(text, number):
     """tiskne error na vystup stderr + ukonci program s urcenou hodnotou (dle zadani)"""
@@ -23,6 +71,44 @@ def print_err(text, number):
     sys.stderr.write(output)
     sys.exit(number)
 
+# Výjimka pro chyby zpracování, které nemají ukončit program (např. validace
+# v režimu serveru, knihovní rozhraní SchemaInferrer), nese text chyby
+# a návratovou hodnotu dle zadání. Program ukončuje pouze funkce main().
+# Podtřídy určují druh chyby a její výchozí návratovou hodnotu.
+class XtdError(Exception):
+    """chyba zpracovani s navratovou hodnotou programu"""
+    code = 1
+
+    def __init__(self, text, code=None):
+        Exception.__init__(self, text)
+        self.text = text
+        if code is not None:
+            self.code = code
+
+class XtdParamError(XtdError):
+    """chybne parametry nebo pozadavek"""
+    code = 1
+
+class XtdInputError(XtdError):
+    """vstupni soubor nelze otevrit"""
+    code = 2
+
+class XtdOutputError(XtdError):
+    """vystup nelze zapsat"""
+    code = 3
+
+class XtdFormatError(XtdError):
+    """vstup neni validni XML"""
+    code = 4
+
+class XtdConflictError(XtdError):
+    """konflikt jmen sloupcu nebo klicu tabulek"""
+    code = 90
+
+class XtdValidError(XtdError):
+    """soubor pro validaci neodpovida tabulkam"""
+    code = 91
+
 # inspirace pouziti parse_args()
 # z manuálových stránek: https://docs.python.org/2/howto/argparse.html
 # funkce parsovani parametru
@@ -34,7 +120,10 @@ def param_parse():
     hphrases = [
         "vypise napovedu na standartni vystup",
 
-        "zadany vstupni soubor ve formatu XML",
+        "zadany vstupni soubor ve formatu XML, lze zadat opakovane, jako"
+        "adresar (vsechny soubory *.xml), vzor (napr. data/*.xml) nebo jako"
+        "@seznam (soubor se seznamem cest, jedna na radek), vysledkem je"
+        "jedina spolecna struktura tabulek",
 
         "zadany vystupni soubor ve formatu definovanam vyse",
 
@@ -54,7 +143,70 @@ def param_parse():
         "definovaneho tvaru v zadani",
 
         "obsahuje data, ktera lze bezezbytku vlozit do databazove struktury"
-        "tabulek vznikle pro soubor dany parametrem"
+        "tabulek vznikle pro soubor dany parametrem",
+
+        "pouziti: (--jobs=n) pro n ≥ 1 urcuje pocet procesu, ve kterych"
+        "probiha analyza vstupu",
+
+        "soubor s ulozenymi vysledky analyzy jednotlivych vstupnich souboru,"
+        "znovu se analyzuji pouze nove a zmenene soubory",
+
+        "pouziti: (--buffer=n) pro n ≥ 1 urcuje velikost vyrovnavaci pameti"
+        "vystupu ve znacich",
+
+        "rezim serveru: struktura tabulek se sestavi jednou ze vstupniho"
+        "souboru, pozadavky na validaci (JSON, jeden na radek) se ctou ze"
+        "standardniho vstupu, odpovedi se tisknou na vystup",
+
+        "pouziti: (--socket=cesta) v rezimu serveru se pozadavky prijimaji"
+        "na Unix socketu misto standardniho vstupu",
+
+        "pouziti: (--data=insert) za prikazy pro vytvoreni tabulek vypise"
+        "data vstupu jako prikazy INSERT, (--data=csv) zapise data do souboru"
+        "<tabulka>.csv v adresari --data-dir",
+
+        "adresar pro soubory CSV (--data=csv)",
+
+        "pouziti: (--batch=n) pro n ≥ 1 urcuje pocet radku jedne davky dat",
+
+        "pouziti: (--sqlite=soubor) vytvori tabulky v databazi SQLite a nahraje"
+        "do nich data vstupu",
+
+        "pouziti: (--stats) po skonceni vypise na stderr doby behu, spicku"
+        "pameti a citace jednotlivych fazi zpracovani (take promenna prostredi"
+        "XTD_STATS=- , nebo XTD_STATS=soubor)",
+
+        "pouziti: (--stats-file=soubor) statistiky zpracovani se ulozi do"
+        "souboru ve formatu JSON",
+
+        "pouziti: (--parser=auto|etree|lxml) volba parseru XML, vychozi auto"
+        "zvoli knihovnu lxml, pokud je nainstalovana a vstup obsahuje"
+        "prevazne text",
+
+        "pouziti: (--sample=n) schema se odvodi z prvnich n zaznamu (podelementu"
+        "korene), (--sample=0.p) z nahodne vybrane casti zaznamu,"
+        "(--sample=reservoir:n) z nahodneho vzorku n zaznamu, malo pozorovane"
+        "tabulky a sloupce se vypisi na stderr",
+
+        "pouziti: (--seed=n) pocatecni hodnota generatoru nahodnych cisel"
+        "pro --sample",
+
+        "pouziti: (--fkey-cap=n) vazby s vice jak n stejnojmennymi podelementy"
+        "se obrati jako s --etc, vazby, jejichz obraceni by zpusobilo konflikt"
+        "jmen, se ponechaji (nelze kombinovat s -b)",
+
+        "pouziti: (--watch) sleduje vstupni soubory, pri jejich zmene znovu"
+        "analyzuje zmenene soubory a prepise vystup, pokud se zmenil",
+
+        "pouziti: (--interval=s) perioda kontroly vstupnich souboru v sekundach"
+        "pro --watch",
+
+        "pouziti: (--diff=soubor) misto prikazu pro vytvoreni vsech tabulek"
+        "vypise pouze prikazy CREATE TABLE a ALTER TABLE pro zmeny oproti"
+        "schematu v souboru (DDL, nebo JSON ulozeny pomoci --save-schema)",
+
+        "pouziti: (--save-schema=soubor) ulozi vysledne tabulky ve formatu JSON"
+        "pro pozdejsi --diff"
     ]
 
     params = argparse.ArgumentParser(add_help=False)
@@ -67,6 +219,25 @@ def param_parse():
     params.add_argument("-b", action="count", default=0, help=hphrases[6])
     params.add_argument("-g", action="count", default=0, help=hphrases[7])
     params.add_argument('--isvalid', action="append", default=[], help=hphrases[8])
+    params.add_argument("--jobs", action="append", default=[], help=hphrases[9])
+    params.add_argument("--cache", action="append", default=[], help=hphrases[10])
+    params.add_argument("--buffer", action="append", default=[], help=hphrases[11])
+    params.add_argument("--serve", action="count", default=0, help=hphrases[12])
+    params.add_argument("--socket", action="append", default=[], help=hphrases[13])
+    params.add_argument("--data", action="append", default=[], help=hphrases[14])
+    params.add_argument("--data-dir", action="append", default=[], help=hphrases[15])
+    params.add_argument("--batch", action="append", default=[], help=hphrases[16])
+    params.add_argument("--sqlite", action="append", default=[], help=hphrases[17])
+    params.add_argument("--stats", action="count", default=0, help=hphrases[18])
+    params.add_argument("--stats-file", action="append", default=[], help=hphrases[19])
+    params.add_argument("--parser", action="append", default=[], help=hphrases[20])
+    params.add_argument("--sample", action="append", default=[], help=hphrases[21])
+    params.add_argument("--seed", action="append", default=[], help=hphrases[22])
+    params.add_argument("--fkey-cap", action="append", default=[], help=hphrases[23])
+    params.add_argument("--watch", action="count", default=0, help=hphrases[24])
+    params.add_argument("--interval", action="append", default=[], help=hphrases[25])
+    params.add_argument("--diff", action="append", default=[], help=hphrases[26])
+    params.add_argument("--save-schema", action="append", default=[], help=hphrases[27])
     return params
 
 # prvne vola paramsParse pro nacteni argumentu, -> ulozi si je do promnene args
@@ -85,9 +256,6 @@ def param_check():
     elif args.help > 0:
         print_err("Nepovolena kombinace argumetnu: help + dalsi argument", 1)
 
-    if len(args.input) > 1:
-        print_err("Je mozny pouze jeden vstupni soubor", 1)
-
     if len(args.output) > 1:
         print_err("Je mozny pouze jeden vystupni soubor", 1)
 
@@ -100,6 +268,131 @@ def param_check():
     if len(args.isvalid) > 1:
         print_err("Je mozne zadat pouze jeden soubor na validovani", 1)
 
+    if len(args.cache) > 1:
+        print_err("Je mozny pouze jeden soubor s ulozenymi vysledky", 1)
+
+    if len(args.cache) == 1 and args.input == []:
+        print_err("Parametr --cache lze pouzit pouze se zadanym vstupem", 1)
+
+    if args.serve > 1 or (args.serve and args.input == []):
+        print_err("Rezim serveru vyzaduje prave jeden parametr --serve a zadany vstup", 1)
+
+    if len(args.socket) > 1 or (args.socket != [] and not args.serve):
+        print_err("Parametr --socket lze zadat pouze jednou a pouze s --serve", 1)
+
+    if len(args.data) > 1 or (args.data != [] and args.data[0] not in ("insert", "csv")):
+        print_err("chyba v parametru --data", 1)
+    args.data = args.data[0] if args.data else None
+
+    if len(args.sqlite) > 1 or (args.sqlite != [] and args.data is not None):
+        print_err("Parametr --sqlite lze zadat pouze jednou a nelze jej kombinovat s --data", 1)
+    if args.sqlite != []:
+        args.data = "sqlite"
+
+    if args.data is not None and (args.input == [] or args.g or args.serve):
+        print_err("Export dat vyzaduje zadany vstup a nelze jej kombinovat s -g a --serve", 1)
+
+    if len(args.data_dir) > 1 or ((args.data == "csv") != (args.data_dir != [])):
+        print_err("Parametr --data-dir je nutne zadat prave jednou a pouze s --data=csv", 1)
+
+    if len(args.batch) > 1:
+        print_err("Je mozna pouze jedna velikost davky", 1)
+
+    args.batch = args.batch[0] if args.batch else str(DATA_BATCH)
+    try:
+        args.batch = int(args.batch)
+    except ValueError:
+        print_err("chyba v parametru --batch", 1)
+    if args.batch < 1:
+        print_err("chyba v parametru --batch", 1)
+
+    if args.stats > 1 or len(args.stats_file) > 1:
+        print_err("Parametry --stats a --stats-file lze zadat pouze jednou", 1)
+
+    # statistiky lze zapnout i bez úpravy příkazové řádky proměnnou prostředí
+    # XTD_STATS ('-' = výpis na stderr, jinak jméno souboru JSON)
+    env = os.environ.get("XTD_STATS", "")
+    if args.stats == 0 and args.stats_file == [] and env != "":
+        if env == "-":
+            args.stats = 1
+        else:
+            args.stats_file = [env]
+
+    if len(args.parser) > 1 or (args.parser != [] and args.parser[0] not in PARSERS):
+        print_err("chyba v parametru --parser", 1)
+    args.parser = args.parser[0] if args.parser else "auto"
+    if args.parser == "lxml" and lxml_etree is None:
+        print_err("Parser lxml neni k dispozici (knihovna lxml neni nainstalovana)", 1)
+
+    if len(args.buffer) > 1:
+        print_err("Je mozna pouze jedna velikost vyrovnavaci pameti", 1)
+
+    args.buffer = args.buffer[0] if args.buffer else str(OUTPUT_BUFFER)
+    try:
+        args.buffer = int(args.buffer)
+    except ValueError:
+        print_err("chyba v parametru --buffer", 1)
+    if args.buffer < 1:
+        print_err("chyba v parametru --buffer", 1)
+
+    if len(args.jobs) > 1:
+        print_err("Je mozny pouze jednou zadany pocet procesu", 1)
+
+    args.jobs = args.jobs[0] if args.jobs else "1"
+    try:
+        args.jobs = int(args.jobs)
+    except ValueError:
+        print_err("chyba v parametru --jobs", 1)
+    if args.jobs < 1:
+        print_err("chyba v parametru --jobs", 1)
+
+    if len(args.sample) > 1 or len(args.seed) > 1:
+        print_err("Parametry --sample a --seed lze zadat pouze jednou", 1)
+    try:
+        args.sample = sample_parse(args.sample[0]) if args.sample else None
+    except XtdError as err:
+        print_err(err.text, err.code)
+    if args.seed != [] and args.sample is None:
+        print_err("Parametr --seed lze pouzit pouze s --sample", 1)
+    try:
+        args.seed = int(args.seed[0]) if args.seed else 0
+    except ValueError:
+        print_err("chyba v parametru --seed", 1)
+    if args.sample is not None and (args.jobs > 1 or args.cache != []
+                                    or args.data is not None or len(args.input) > 1):
+        print_err("Parametr --sample nelze kombinovat s --jobs, --cache, --data"
+                  " a vice vstupy", 1)
+
+    if len(args.fkey_cap) > 1 or (args.fkey_cap != [] and args.b > 0):
+        print_err("Parametr --fkey-cap lze zadat pouze jednou a nelze jej kombinovat s -b", 1)
+    try:
+        args.fkey_cap = int(args.fkey_cap[0]) if args.fkey_cap else None
+    except ValueError:
+        print_err("chyba v parametru --fkey-cap", 1)
+    if args.fkey_cap is not None and args.fkey_cap < 0:
+        print_err("chyba v parametru --fkey-cap", 1)
+
+    if args.watch > 1 or len(args.interval) > 1:
+        print_err("Parametry --watch a --interval lze zadat pouze jednou", 1)
+    if args.watch and (args.input == [] or args.serve or args.data is not None
+                       or args.sample is not None or args.cache != [] or args.isvalid != []):
+        print_err("Rezim sledovani vyzaduje zadany vstup a nelze jej kombinovat"
+                  " s --serve, --data, --sample, --cache a --isvalid", 1)
+    if args.interval != [] and not args.watch:
+        print_err("Parametr --interval lze pouzit pouze s --watch", 1)
+    try:
+        args.interval = float(args.interval[0]) if args.interval else WATCH_INTERVAL
+    except ValueError:
+        print_err("chyba v parametru --interval", 1)
+    if not args.interval > 0:
+        print_err("chyba v parametru --interval", 1)
+
+    if len(args.diff) > 1 or len(args.save_schema) > 1:
+        print_err("Parametry --diff a --save-schema lze zadat pouze jednou", 1)
+    if (args.diff != [] or args.save_schema != []) and (args.g or args.serve or args.watch):
+        print_err("Parametry --diff a --save-schema nelze kombinovat s -g, --serve"
+                  " a --watch", 1)
+
     if args.a > 1:
         print_err("chyba v prepinaci -a, pro radu spustte program s predvolbou --help, nebo -h", 1)
 
@@ -107,12 +400,105 @@ def param_check():
     if args.b > 1 or (args.b > 0 and  etc_lenght > 0):
         print_err("chyba v prepinaci -b, pro radu spustte program s predvolbou --help, nebo -h", 1)
 
+    # hodnota parametru --etc (None bez parametru)
+    try:
+        args.etc = int(args.etc[0]) if args.etc else None
+    except ValueError:
+        print_err("chyba v parametru --etc", 1)
+
     if args.g > 1:
         print_err("chyba v prepinaci -a, pro radu spustte program s predvolbou --help, nebo -h", 1)
 
     return args
 
-# Třída pro elementy stromu, obsahuje 3 atributy:
+# Funkce rozvine zadané vstupy (parametr --input) na seznam souborů:
+#   - adresář    = všechny soubory s příponou .xml (i komprimované, viz
+#                  INPUT_SUFFIXES) v daném adresáři
+#   - vzor       = soubory odpovídající vzoru (glob), např. data/**/*.xml
+#   - @seznam    = soubor obsahující cesty ke vstupním souborům (jedna na řádek)
+#   - jinak se jedná přímo o cestu k souboru
+# Soubory z adresáře a vzoru jsou seřazeny, výsledek tak nezávisí na pořadí
+# vrácenému souborovým systémem.
+def input_files(patterns):
+    """vraci seznam vstupnich souboru"""
+
+    files = []
+    for pattern in patterns:
+        if pattern.startswith("@"):
+            try:
+                with open(pattern[1:], "r") as listing:
+                    files.extend(line.strip() for line in listing if line.strip() != "")
+            except OSError:
+                raise XtdInputError("Nepovedlo se otevrit seznam vstupnich souboru")
+        elif os.path.isdir(pattern):
+            names = sorted(os.listdir(pattern))
+            files.extend(os.path.join(pattern, name) for name in names
+                         if name.lower().endswith(INPUT_SUFFIXES))
+        elif any(char in pattern for char in "*?["):
+            files.extend(sorted(glob.glob(pattern, recursive=True)))
+        else:
+            files.append(pattern)
+
+    if patterns != [] and files == []:
+        raise XtdInputError("Zadanym vstupum neodpovida zadny soubor")
+    return files
+
+# Vstup se parseru předává v binárním režimu, kódování tedy určuje parser
+# podle deklarace XML (nebo BOM), nikoliv textová vrstva.
+# Komprimované vstupy (gzip, xz, bzip2, zstd) se rozpoznají podle úvodních
+# bajtů (nezávisle na příponě) a dekomprimují se proudově, pro zstd je nutný
+# modul compression.zstd (Python 3.14+), nebo knihovna zstandard.
+# Nekomprimované běžné soubory se mapují do paměti (mmap), data se tak
+# nekopírují přes vyrovnávací paměť souboru, ostatní vstupy (roury, prázdné
+# soubory) se čtou přímo.
+INPUT_SUFFIXES = (".xml", ".xml.gz", ".xml.xz", ".xml.bz2", ".xml.zst")
+INPUT_MAGIC = (
+    (b"\x1f\x8b", "gzip"),
+    (b"\xfd7zXZ\x00", "xz"),
+    (b"BZh", "bzip2"),
+    (b"\x28\xb5\x2f\xfd", "zstd"),
+)
+
+def input_stream(raw):
+    """vraci binarni proud vstupu raw (otevreneho binarne), pripadne
+    dekomprimovany nebo mapovany do pameti"""
+
+    magic = raw.peek(6)[:6]
+    for prefix, kind in INPUT_MAGIC:
+        if magic.startswith(prefix):
+            if kind == "gzip":
+                return gzip.GzipFile(fileobj=raw, mode="rb")
+            if kind == "xz":
+                return lzma.LZMAFile(raw)
+            if kind == "bzip2":
+                return bz2.BZ2File(raw)
+            if zstd is None:
+                raise OSError("pro vstup zstd je nutna knihovna zstandard")
+            if hasattr(zstd, "ZstdFile"):
+                return zstd.ZstdFile(raw)
+            return io.BufferedReader(zstd.ZstdDecompressor().stream_reader(
+                raw, read_across_frames=True, closefd=False))
+
+    try:
+        if raw.tell() == 0:
+            return mmap.mmap(raw.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        pass
+    return raw
+
+@contextlib.contextmanager
+def input_open(path):
+    """otevre vstupni soubor path pro parser, viz input_stream()"""
+
+    with open(path, "rb") as raw:
+        stream = input_stream(raw)
+        try:
+            yield stream
+        finally:
+            stream.close()
+
+# Třída pro elementy stromu, obsahuje 3 atributy (__slots__, instance tedy
+# nemají vlastní slovník atributů, u desítek tisíc tabulek je to znát):
 #   - tag       = je roven názvu tabulky, slouží pro snadnější
 #                 implementaci ostatních třídních metod
 #   - atributs  = obsahuje slovník atributů danné tabulky, u každého atributu
@@ -121,6 +507,8 @@ def param_check():
 #                 stejně tak i jeho četnost v rámci tabulky
 class TableElement:
     """trida pro abstrakne definujici vyslednou tabulky a jeji prvky"""
+    __slots__ = ("tag", "atributs", "fkey")
+
     def __init__(self, tag):
         self.tag = tag
         self.atributs = {}
@@ -140,7 +528,7 @@ class TableElement:
         try:
             if self.atributs[name] < type_of_elm:
                 self.atributs[name] = type_of_elm
-        except:
+        except KeyError:
             self.atributs[name] = type_of_elm
 
 
@@ -156,291 +544,1713 @@ class TableElement:
         """odsrani cizy klic z dane tabulky"""
         del self.fkey[tag]
 
-# funkce gettype_of_elm(element) vrací řetězec - typ elementu podle zadání
-def get_type(element):
-    """vraci typ predaneho elementu"""
+    # sloučení s dílčím výsledkem jiné části vstupu, typy sloupců se pouze
+    # zvyšují a u cizých klíčů se ponechává maximální četnost, výsledek tedy
+    # nezávisí na tom, jak byl vstup rozdělen
+    def merge(self, other):
+        """slouci tabulku s jinou stejnojmennou tabulkou"""
+        for name in other.atributs:
+            self.give_atr(name, other.atributs[name])
+        for tag in other.fkey:
+            self.givefkey(tag, other.fkey[tag])
+
+# Funkce sloučí dílčí slovník tabulek 'part' do slovníku 'work_dict'.
+# Při slučování dílčích výsledků v pořadí, v jakém se části nachází ve vstupu,
+# je výsledek (včetně pořadí tabulek a sloupců) totožný se zpracováním celého
+# vstupu najednou.
+def merge_work(work_dict, part):
+    """slouci dilci vysledek analyzy do slovniku tabulek"""
+
+    for tag in part:
+        if tag in work_dict:
+            work_dict[tag].merge(part[tag])
+        else:
+            work_dict[tag] = part[tag]
+
+# Klasifikace hodnot pro funkci get_type(), namísto pokusů o převod pomocí
+# int() a float() (řízení výjimkami) se hodnota porovná s předkompilovanými
+# regulárními výrazy, které odpovídají zápisům přijímaným int() a float()
+# (včetně znamének, podtržítek mezi číslicemi, exponentu, inf a nan).
+# Velikost písmen se neřeší převodem na malá písmena, ale přímo ve výrazech.
+BIT_VALUES = frozenset(("1", "0", "false", "true"))
+INT_RE = re.compile(r"[+-]?\d+(?:_\d+)*")
+FLOAT_RE = re.compile(
+    r"[+-]?(?:"
+    r"(?:\d+(?:_\d+)*)?\.\d+(?:_\d+)*(?:[eE][+-]?\d+(?:_\d+)*)?"
+    r"|\d+(?:_\d+)*\.?(?:[eE][+-]?\d+(?:_\d+)*)?"
+    r"|[iI][nN][fF](?:[iI][nN][iI][tT][yY])?"
+    r"|[nN][aA][nN])")
+
+# maximální délka hodnoty, jejíž typ se ukládá do cache, a velikost cache
+TYPE_CACHE_LEN = 64
+TYPE_CACHE_SIZE = 8192
+
+# funkce classify() vrací typ hodnoty podle zadání (bez cache)
+def classify(element):
+    """vraci typ predane hodnoty"""
 
     # test zda-li se jedná o bitovou hodnotu
-    if element == '1' or element == '0' or element == 'false' or element == 'true':
+    if element in BIT_VALUES or (len(element) < 6 and element.lower() in BIT_VALUES):
+        return BIT
+
+    # bílé znaky na okrajích int() i float() ignorují
+    stripped = element.strip()
+
+    # prázdný řetězec (myšleno, že je sestaven pouze bílými znaky)
+    if stripped == "":
         return BIT
 
     # test zda-li se jedná o celé číslo
-    try:
-        int(element)
+    if INT_RE.fullmatch(stripped):
         return INT
-    except ValueError:
-        pass
 
     # test zda-li se jedná o číslo s plovoucím desetiným místem
-    try:
-        float(element)
+    if FLOAT_RE.fullmatch(stripped):
         return FLOAT
-    except ValueError:
-        pass
 
     # jinak se jedná o řetězec
-    # poslední kontrola jestli se nejedná o prázdný řetězec
-    # (myšleno, že je sestaven pouze bílými znaky)
-    if element.strip() == "":
-        return BIT
     return STR
 
-# rekurzí implemenotvaná funkce jež slouží pro průchod stromem který byl
-# vytvořen pomocí ET.parse().
-# nemá návratovou hodnotu, jejím výsledkem je sestavená hierarchie tabulek,
-# atributů a cizých klíčů v zadaeném slovníku.
-# informace o existenci parametru '-a' je předávána pomocí promněnné 'param_a'
-# v případě, že je přítomna, negenerují se sloupce z atributů.
-def do_xml(tree, root, param_a, work_dict):
-    """funcke analyzuje predanou stromovou strukturu a inicializuje jednotlive tabulky"""
+classify_cached = functools.lru_cache(maxsize=TYPE_CACHE_SIZE)(classify)
 
-    # pomocný set cizých klíčů, po projití uzlem uložen do atributu 'fkey'
-    # Elementu daného uzlu
-    counter = {}
+# funkce get_type(element) vrací typ hodnoty podle zadání, krátké hodnoty
+# (typicky opakující se výčtové hodnoty) se ukládají do LRU cache
+def get_type(element):
+    """vraci typ predaneho elementu"""
+
+    if len(element) <= TYPE_CACHE_LEN:
+        return classify_cached(element)
+    return classify(element)
+
+# Vrstva parseru XML, proudová analýza (do_xml_stream(), data_rows(),
+# valid_stream()) i analýza dávek paralelního zpracování používá zvolený
+# backend (parametr --parser):
+#   - "etree" = xml.etree.ElementTree ze standardní knihovny (expat)
+#   - "lxml"  = knihovna lxml (libxml2), parser odstraňuje komentáře
+#               a instrukce pro zpracování (text elementu je pak totožný
+#               s ElementTree), s huge_tree neomezuje délku textu, hloubka
+#               dokumentu je ale i tak omezena (libxml2: 2048 úrovní)
+#   - "auto"  = lxml, pokud je nainstalována a vstup obsahuje převážně text,
+#               jinak etree (i pro úvod vstupu bez ukončených elementů nebo
+#               s hlubokým zanořením)
+# Pro každý element se volá kód v Pythonu a lxml vytváří pro element i jeho
+# atributy nové objekty, na dokumentech s hustým značkováním je proto lxml
+# pomalejší než ElementTree, rychlejší je až na dokumentech s delšími texty
+# (přibližně od 300 bajtů vstupu na element). Volba "auto" proto rozhoduje
+# podle průměrného počtu bajtů na ukončený element v úvodu vstupu.
+# Vstup bez bajtové podoby (např. io.StringIO) zpracovává vždy ElementTree.
+# Dokument hlubší, než dovoluje libxml2, se zpracuje znovu pomocí ElementTree
+# (viz parser_retry()), pokud lze vstup číst znovu (soubor, ne roura).
+PARSERS = ("auto", "etree", "lxml")
+PARSER_BACKEND = "etree"
+PARSER_SAMPLE = 1 << 16
+PARSER_TEXT_RATIO = 256
+PARSER_DEPTH = 256
+
+# chyby parseru a chyby dekomprimace vstupu (poškozený, nebo neúplný vstup)
+PARSE_ERRORS = (ET.ParseError, xml.parsers.expat.ExpatError, UnicodeError,
+                EOFError, gzip.BadGzipFile, lzma.LZMAError)
+if lxml_etree is not None:
+    PARSE_ERRORS += (lxml_etree.ParseError,)
+if zstd is not None:
+    PARSE_ERRORS += (zstd.ZstdError,)
+
+def parser_choose(name, sample=b""):
+    """vraci jmeno backendu parseru XML (pro auto dle ukazky vstupu)"""
+
+    if name == "auto":
+        # značky se počítají v textu ukázky (UTF-16 apod. nejsou kompatibilní s ASCII)
+        encoding = sample_encoding(sample)
+        if encoding is not None:
+            sample = sample.decode(encoding, "ignore").encode("utf-8")
+        ends = sample.count(b"</") + sample.count(b"/>")
+        # hloubka zanoření na konci ukázky (komentáře a instrukce se nepočítají)
+        depth = (sample.count(b"<") - sample.count(b"<!") - sample.count(b"<?")
+                 - ends - sample.count(b"</"))
+        if (lxml_etree is not None and ends > 0 and depth < PARSER_DEPTH
+                and len(sample) >= PARSER_TEXT_RATIO * ends):
+            name = "lxml"
+        else:
+            name = "etree"
+    return name
+
+def parser_select(name, sample=b""):
+    """nastavi vychozi backend parseru XML, vraci jeho jmeno"""
+
+    global PARSER_BACKEND
+    PARSER_BACKEND = parser_choose(name, sample)
+    return PARSER_BACKEND
+
+# Opakování analýzy vstupu istream pomocí ElementTree, pokud lxml odmítne
+# příliš hluboký dokument: analyze(backend) provede celou analýzu (a před ní
+# vyprázdní své výsledky), při opakování se vstup vrátí na původní pozici.
+# Pokud se použil výchozí backend (backend je None), přepne se výchozí
+# backend na etree i pro další průchody vstupem (export dat).
+def parser_retry(istream, backend, analyze):
+    """vola analyze(backend), pri prekroceni hloubky v lxml analyze("etree")"""
+
+    position = None
+    if (backend or PARSER_BACKEND) == "lxml":
+        try:
+            position = istream.tell()
+        except (AttributeError, OSError, ValueError):
+            position = None
+    try:
+        return analyze(backend)
+    except PARSE_ERRORS as err:
+        if position is None or not parser_too_deep(err, backend):
+            raise
+    istream.seek(position)
+    if backend is None:
+        parser_select("etree")
+    return analyze("etree")
+
+def parser_too_deep(err, backend=None):
+    """vraci True pro chybu lxml pri prekroceni maximalni hloubky dokumentu"""
+
+    return ((backend or PARSER_BACKEND) == "lxml"
+            and isinstance(err, lxml_etree.XMLSyntaxError) and "depth" in str(err).lower())
+
+def parser_sample(istream, files):
+    """vraci ukazku zacatku vstupu pro volbu backendu parseru"""
+
+    if istream is not None:
+        if isinstance(istream, mmap.mmap):
+            return istream[:PARSER_SAMPLE]
+        if hasattr(istream, "peek"):
+            return istream.peek(PARSER_SAMPLE)[:PARSER_SAMPLE]
+        try:
+            position = istream.tell()
+            sample = istream.read(PARSER_SAMPLE)
+            istream.seek(position)
+        except (AttributeError, OSError, ValueError):
+            return b""
+        return bytes(sample) if isinstance(sample, (bytes, bytearray)) else b""
+    if files == []:
+        return b""
+    try:
+        with input_open(files[0]) as data:
+            return data.read(PARSER_SAMPLE)
+    except OSError:
+        return b""
+
+# Kódování vstupu, které není kompatibilní s ASCII, dle BOM, dle prvních
+# znaků '<?' (bez BOM), nebo dle deklarace XML. Pro ostatní vstupy (UTF-8,
+# ISO-8859-x, ...) vrací None.
+XML_BOMS = ((codecs.BOM_UTF32_LE, "utf-32"), (codecs.BOM_UTF32_BE, "utf-32"),
+            (codecs.BOM_UTF16_LE, "utf-16"), (codecs.BOM_UTF16_BE, "utf-16"),
+            (b"<\x00\x00\x00", "utf-32-le"), (b"\x00\x00\x00<", "utf-32-be"),
+            (b"<\x00?\x00", "utf-16-le"), (b"\x00<\x00?", "utf-16-be"))
+XML_DECLARATION = re.compile(rb"<\?xml[^>]*?encoding\s*=\s*[\"']([A-Za-z0-9._-]+)")
+
+def sample_encoding(sample):
+    """vraci kodovani ukazky vstupu, pokud neni kompatibilni s ASCII"""
+
+    for prefix, encoding in XML_BOMS:
+        if sample.startswith(prefix):
+            return encoding
+    match = XML_DECLARATION.match(sample)
+    if match is not None:
+        encoding = match.group(1).decode("ascii")
+        try:
+            if b"<?xml".decode(encoding) != "<?xml":
+                return encoding
+        except (LookupError, UnicodeError):
+            pass
+    return None
+
+# Backend parseru lze zadat parametrem backend (SchemaInferrer), jinak se
+# použije výchozí backend PARSER_BACKEND nastavený funkcí parser_select().
+def iterparse(source, backend=None):
+    """vraci iterator udalosti (start, end) nad vstupem source"""
+
+    if (backend or PARSER_BACKEND) == "lxml":
+        raw = getattr(source, "buffer", source)
+        if not isinstance(raw, io.TextIOBase):
+            return lxml_etree.iterparse(raw, events=("start", "end"), huge_tree=True,
+                                        remove_comments=True, remove_pis=True)
+    return ET.iterparse(source, events=("start", "end"))
+
+def fromstring(data, backend=None):
+    """vraci korenovy element dokumentu data (bajty)"""
+
+    if (backend or PARSER_BACKEND) == "lxml":
+        return lxml_etree.fromstring(data, lxml_etree.XMLParser(
+            huge_tree=True, remove_comments=True, remove_pis=True))
+    return ET.fromstring(data)
+
+# Jména elementů a atributů převedená na malá písmena, převod se provádí
+# pouze jednou pro každé jméno a jména tabulek i sloupců jsou sdílené
+# (internované) řetězce. Sdílený slovník NAMES používá příkazová řádka,
+# SchemaInferrer má vlastní slovník (uvolní se spolu s ním).
+NAMES = {}
+
+def name_lower(name, names=NAMES):
+    """vraci jmeno prevedene na mala pismena (internovane)"""
+
+    lower = names.get(name)
+    if lower is None:
+        # jména již psaná malými písmeny se nekopírují
+        lower = name.lower()
+        lower = names[name] = sys.intern(name if lower == name else lower)
+    return lower
+
+# Pomocné funkce společné pro průchod stromem (do_xml) i pro proudové
+# zpracování vstupu (do_xml_stream).
+# table_start() zpracuje otevření elementu - založí tabulku, doplní sloupce
+# z atributů a započte element do čítače rodiče (counter je None u potomků
+# kořenového elementu, ty se jako cizí klíče nepočítají).
+# table_end() zpracuje uzavření elementu - textový obsah uloží do sloupce
+# 'value' a četnosti podelementů předá tabulce jako cizí klíče.
+def table_start(tag, attrib, param_a, counter, work_dict, names=NAMES):
+    """zpracuje otevreni elementu se jmenem tag (jiz prevedenym na mala pismena)"""
+
+    if tag not in work_dict:
+        work_dict[tag] = TableElement(tag)
+
+    if counter is not None:
+        try:
+            counter[tag] += 1
+        except KeyError:
+            counter[tag] = 1
 
-    # zpracovani vsech potomku root korene, do hloubky.
-    # implementovano rekurzi
-    # vytvoreni seznamu Atributu daného Tagu v tabulce TableElementů
-    for child in root.getchildren():
-        child.tag = child.tag.lower()
-        if child.tag not in work_dict.keys():
-            work_dict[child.tag.lower()] = TableElement(child.tag.lower())
+    if not param_a:
+        table = work_dict[tag]
+        for actual in attrib:
+            data = get_type(attrib[actual])
+            if data == STR:
+                data = NVARCHAR
+            table.give_atr(names.get(actual) or name_lower(actual, names), data)
 
-        if root != tree.getroot():
-            try:
-                counter[child.tag] += 1
-            except:
-                counter[child.tag] = 1
-
-        if not param_a:
-            for actual in child.attrib:
-                tag = child.tag.lower()
-                if get_type(child.attrib[actual].lower()) == STR:
-                    work_dict[tag].give_atr(actual.lower(), NVARCHAR)
-                else:
-                    attr = child.attrib
-                    work_dict[tag].give_atr(actual.lower(), get_type(attr[actual.lower()].lower()))
-        do_xml(tree, child, param_a, work_dict)
+def table_end(tag, text, counter, work_dict):
+    """zpracuje uzavreni elementu se jmenem tag (jiz prevedenym na mala pismena)"""
 
-    # zpracovani textu v aktualnim Elementu
-    if format(root.text).strip() != '' and root.text != None:
-        data = get_type(root.text.lower())
+    if text is not None and text.strip() != '':
+        data = get_type(text)
         if data == STR:
             data = NTEXT
+        work_dict[tag].give_atr("value", data)
+
+    for key in counter:
+        work_dict[tag].givefkey(key, counter[key])
+
+# Proudová varianta funkce do_xml() pro velké vstupy, implementována pomocí
+# ET.iterparse(). Celý strom se nikdy nesestavuje - po zpracování je každý
+# element uvolněn a odebrán od svého rodiče, paměťová náročnost tak odpovídá
+# hloubce dokumentu, nikoliv jeho velikosti.
+# Zásobník obsahuje pro každou úroveň trojici (element, tag, čítač potomků),
+# pořadí volání table_start()/table_end() odpovídá rekurzivnímu průchodu,
+# výsledný work_dict (včetně pořadí tabulek a sloupců) je tedy totožný.
+# Jména elementů se převádí na malá písmena pomocí slovníku names (výchozí
+# sdílený slovník NAMES).
+# Backend parseru viz iterparse() a parser_retry() (work_dict se při
+# opakování analýzy vyprázdní), wrap(events) může obalit události parseru
+# (počítání elementů pro --stats).
+# Vrací původní tag kořenového elementu (pro získání jmenného prostoru).
+def do_xml_stream(istream, param_a, work_dict, backend=None, names=NAMES, wrap=None):
+    """proudove analyzuje vstup a inicializuje jednotlive tabulky"""
+
+    def analyze(backend):
+        work_dict.clear()
+        events = iterparse(istream, backend)
+        if wrap is not None:
+            events = wrap(events)
+        return do_xml_events(events, param_a, work_dict, names)
+
+    return parser_retry(istream, backend, analyze)
+
+# Po konci kořenového elementu se dočte zbytek vstupu, parser tak ohlásí
+# chybu při obsahu za kořenovým elementem (stejně jako ET.parse() a --jobs).
+def events_drain(events):
+    """docte zbyvajici udalosti parseru"""
+
+    for _ in events:
+        pass
 
-        # osetření případů kdy daný atribut již existuje, v tom případě se
-        # kontroluje jeho hodnota a v případě že je nižší než aktuální, tak se
-        # přepíše
+# Analýza posloupnosti dvojic (událost, element) ve tvaru, jaký vrací
+# iterparse() s událostmi "start" a "end" (lze předat i vlastní zdroj
+# událostí, viz SchemaInferrer.feed_events()). Zpracované elementy se
+# uvolňují ze stromu, analýza končí koncem kořenového elementu.
+def do_xml_events(events, param_a, work_dict, names=NAMES):
+    """analyzuje udalosti parseru a inicializuje jednotlive tabulky"""
+
+    events = iter(events)
+    stack = []
+    root_tag = None
+
+    for event, elem in events:
+        if event == "start":
+            tag = names.get(elem.tag) or name_lower(elem.tag, names)
+            if root_tag is None:
+                root_tag = elem.tag
+                stack.append((elem, tag, None))
+                continue
+            table_start(tag, elem.attrib, param_a, stack[-1][2], work_dict, names)
+            stack.append((elem, tag, {}))
+        else:
+            elem, tag, counter = stack.pop()
+            if counter is None:
+                # kořenový element není tabulkou, jeho text se uplatní pouze
+                # v případě, že existuje stejnojmenná tabulka
+                if tag in work_dict:
+                    table_end(tag, elem.text, NO_CHILDREN, work_dict)
+                events_drain(events)
+                break
+            table_end(tag, elem.text, counter, work_dict)
+
+            # uvolnění zpracovaného podstromu
+            elem.clear()
+            del stack[-1][0][-1]
+
+    return root_tag
+
+# Odvození schématu ze vzorku záznamů (parametr --sample), záznamem se
+# rozumí podelement kořene (včetně celého jeho podstromu):
+#   - ("first", n)      = prvních n záznamů, zbytek vstupu se nečte
+#   - ("fraction", p)   = každý záznam s pravděpodobností p, ostatní záznamy
+#                         se parsují, ale neanalyzují
+#   - ("reservoir", n)  = rovnoměrně náhodný vzorek n záznamů (reservoir
+#                         sampling), záznamy vzorku se drží v paměti a analyzují
+#                         se až na konci vstupu v pořadí, v jakém jsou ve vstupu
+# Počty pozorování tabulek a sloupců ve vzorku se uchovávají ve slovníku
+# observed ((tabulka, None) = výskyty tabulky, (tabulka, sloupec) = výskyty
+# sloupce) pro varování o málo pozorovaných tabulkách a sloupcích, jejichž typ
+# nebo cizí klíče mohou na celém vstupu vyjít jinak.
+SAMPLE_SEEN = 30
+
+def sample_parse(spec):
+    """vraci dvojici (druh vyberu, hodnota) dle parametru --sample"""
+
+    try:
+        if spec.startswith("reservoir:"):
+            sample = ("reservoir", int(spec[len("reservoir:"):]))
+        elif "." in spec:
+            sample = ("fraction", float(spec))
+        else:
+            sample = ("first", int(spec))
+    except ValueError:
+        raise XtdParamError("chyba v parametru --sample")
+    if sample[1] <= 0 or (sample[0] == "fraction" and sample[1] > 1):
+        raise XtdParamError("chyba v parametru --sample")
+    return sample
+
+def sample_observe(observed, elem, tag, param_a):
+    """zapocte pozorovani tabulky a jejich sloupcu pro element elem"""
+
+    observed[(tag, None)] = observed.get((tag, None), 0) + 1
+    if not param_a:
+        for actual in elem.attrib:
+            key = (tag, name_lower(actual))
+            observed[key] = observed.get(key, 0) + 1
+    if elem.text is not None and elem.text.strip() != '':
+        observed[(tag, "value")] = observed.get((tag, "value"), 0) + 1
+
+# Vrací původní tag kořenového elementu, slovník observed a počty záznamů
+# (přečtené, analyzované), počet přečtených je None, pokud se vstup nečetl
+# celý.
+def do_xml_sample(istream, param_a, work_dict, sample, seed):
+    """analyzuje vzorek zaznamu vstupu"""
+
+    def analyze(backend):
+        work_dict.clear()
+        return sample_events(iterparse(istream, backend), param_a, work_dict, sample, seed)
+
+    return parser_retry(istream, None, analyze)
+
+def sample_events(events, param_a, work_dict, sample, seed):
+    """analyzuje vzorek zaznamu z udalosti parseru"""
+
+    events = iter(events)
+    kind, value = sample
+    rnd = random.Random(seed)
+    observed = {}
+    reservoir = []
+    stack = []
+    root = None
+    skip = 0
+    records = 0
+    taken = 0
+    complete = True
+
+    for event, elem in events:
+        if event == "start":
+            if root is None:
+                root = elem
+                stack.append((elem, name_lower(elem.tag), None))
+                continue
+            if skip:
+                skip += 1
+                continue
+            if len(stack) == 1:
+                # začátek záznamu, rozhodnutí o jeho analýze
+                if kind == "first" and taken == value:
+                    complete = False
+                    break
+                records += 1
+                if kind == "reservoir" or (kind == "fraction" and rnd.random() >= value):
+                    skip = 1
+                    continue
+                taken += 1
+            tag = name_lower(elem.tag)
+            table_start(tag, elem.attrib, param_a, stack[-1][2], work_dict)
+            stack.append((elem, tag, {}))
+            continue
+
+        if skip:
+            skip -= 1
+            if skip == 0:
+                # konec nevybraného záznamu (reservoir: kandidát do vzorku)
+                del root[-1]
+                if kind != "reservoir":
+                    elem.clear()
+                elif len(reservoir) < value:
+                    reservoir.append((records, elem))
+                else:
+                    index = rnd.randrange(records)
+                    if index < value:
+                        reservoir[index] = (records, elem)
+            continue
+
+        elem, tag, counter = stack.pop()
+        if counter is None:
+            # konec kořenového elementu, zbytek vstupu viz events_drain()
+            events_drain(events)
+            break
+        sample_observe(observed, elem, tag, param_a)
+        table_end(tag, elem.text, counter, work_dict)
+        elem.clear()
+        del stack[-1][0][-1]
+
+    if kind == "reservoir":
+        # analýza vzorku v pořadí záznamů ve vstupu
+        reservoir.sort(key=operator.itemgetter(0))
+        taken = len(reservoir)
+        records_root = root.makeelement(root.tag, {})
+        for _, record in reservoir:
+            records_root.append(record)
+            for child in record.iter():
+                sample_observe(observed, child, name_lower(child.tag), param_a)
+        do_xml(ET.ElementTree(records_root), records_root, param_a, work_dict)
+
+    # kořenový element není tabulkou, jeho text se uplatní pouze v případě,
+    # že existuje stejnojmenná tabulka
+    tag = name_lower(root.tag)
+    if tag in work_dict:
+        table_end(tag, root.text, NO_CHILDREN, work_dict)
+
+    return root.tag, observed, (records if complete else None, taken)
+
+def sample_report(work_dict, observed, counts, namespace):
+    """vypise na stderr varovani o malo pozorovanych tabulkach a sloupcich"""
+
+    short = NamespaceStrip(namespace)
+    records, taken = counts
+    if records is None:
+        sys.stderr.write("WARNING:Schema odvozeno z prvnich {} zaznamu"
+                         " (vstup nebyl precten cely)\n".format(taken))
+    else:
+        sys.stderr.write("WARNING:Schema odvozeno z {} z {} zaznamu\n".format(taken, records))
+
+    for tag, table in work_dict.items():
+        seen = observed.get((tag, None), 0)
+        if seen < SAMPLE_SEEN:
+            sys.stderr.write("WARNING:Tabulka {} pozorovana {}x, typy sloupcu a pocty"
+                             " cizich klicu nemusi byt uplne\n".format(short[tag], seen))
+            continue
+        for atribut, type_of_elm in table.atributs.items():
+            seen = observed.get((tag, atribut), 0)
+            if seen < SAMPLE_SEEN:
+                sys.stderr.write("WARNING:Sloupec {}.{} ({}) pozorovan {}x\n".format(
+                    short[tag], short[atribut], TYPE_NAMES[type_of_elm], seen))
+
+# Funkce volaná v pracovních procesech paralelního zpracování (--jobs), data
+# obsahují úvod dokumentu (prolog a počáteční značku kořene), nezměněné bajty
+# několika elementů nejvyšší úrovně a koncovou značku kořene.
+# Vrací dílčí slovník tabulek.
+# Funkce do_xml_chunk() a do_xml_file() běží v pracovních procesech, chyby
+# parseru (např. lxml.etree.XMLSyntaxError) nelze vždy předat hlavnímu procesu
+# (pickle), převádí se proto na XtdFormatError.
+def do_xml_chunk(data, param_a):
+    """analyzuje jednu cast vstupu, vraci dilci slovnik tabulek"""
+
+    work_dict = {}
+    try:
         try:
-            value = work_dict[root.tag.lower()].atributs["value"]
-            if data > value:
-                work_dict[root.tag.lower()].atributs["value"] = data
-        except:
-            work_dict[root.tag.lower()].atributs["value"] = data
+            root = fromstring(data)
+        except PARSE_ERRORS as err:
+            if not parser_too_deep(err):
+                raise
+            root = fromstring(data, "etree")
+    except PARSE_ERRORS:
+        raise XtdFormatError("Vstupni soubor neni validni XML soubor")
+
+    # text kořene zpracovává pouze hlavní proces
+    root.text = None
+    do_xml(ET.ElementTree(root), root, param_a, work_dict)
+    return work_dict
+
+# Paralelní varianta funkce do_xml_stream() pro parametr --jobs.
+# Podstromy elementů nejvyšší úrovně jsou na sobě nezávislé (jejich četnost se
+# do cizích klíčů nepočítá), hlavní proces proto pouze dělí vstup na dávky
+# o velikosti přibližně JOB_BYTES bajtů na hranicích těchto elementů (viz
+# XmlSplitter) a nezměněné bajty vstupu předává pracovním procesům. Dílčí
+# výsledky se slučují v pořadí dávek, výstup je tedy totožný se sekvenčním
+# zpracováním. Počet rozpracovaných dávek je omezen, paměťová náročnost tedy
+# nezávisí na velikosti vstupu.
+# Dávky se skládají z bajtů vstupu, vstup v kódování, které není kompatibilní
+# s ASCII (UTF-16, UTF-32), se proto zpracuje sekvenčně funkcí do_xml_stream().
+# Vrací původní tag kořenového elementu (pro získání jmenného prostoru).
+JOB_BYTES = 1 << 20
+JOB_BLOCK = 1 << 20
+
+def do_xml_parallel(istream, param_a, work_dict, jobs):
+    """proudove analyzuje vstup ve vice procesech"""
+
+    if sample_encoding(parser_sample(istream, [])) is not None:
+        return do_xml_stream(istream, param_a, work_dict)
+
+    splitter = XmlSplitter(getattr(istream, "buffer", istream), JOB_BYTES)
+    pending = collections.deque()
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=jobs, initializer=parser_select,
+            initargs=(PARSER_BACKEND,)) as pool:
+        for data in splitter:
+            pending.append(pool.submit(do_xml_chunk, data, param_a))
+            if len(pending) > 2 * jobs:
+                merge_work(work_dict, pending.popleft().result())
+        while pending:
+            merge_work(work_dict, pending.popleft().result())
+
+    # kořenový element není tabulkou, jeho text se uplatní pouze v případě,
+    # že existuje stejnojmenná tabulka
+    tag = name_lower(splitter.tag)
+    if tag in work_dict:
+        table_end(tag, splitter.text, NO_CHILDREN, work_dict)
+
+    return splitter.tag
+
+# Jeden token značkování včetně předcházejícího textu: skupina 1 = začátek
+# značky, 2 = koncová značka, 3 = komentář, CDATA, instrukce nebo deklarace
+# (hodnoty atributů mohou obsahovat znak '>').
+XML_TOKEN = re.compile(
+    rb"[^<]*(<)(?:(/)[^>]*>"
+    rb"|(!--.*?--|!\[CDATA\[.*?\]\]|\?.*?\?"
+    rb"|![^>\[\"']*(?:(?:\"[^\"]*\"|'[^']*')[^>\[\"']*)*(?:\[.*?\][^>]*)?)>"
+    rb"|[^>\"']*(?:(?:\"[^\"]*\"|'[^']*')[^>\"']*)*>)", re.S)
+
+# Části vstupu, ve kterých nelze hloubku určit pouhým počtem znaků '<', '</'
+# a '/>': komentáře, CDATA a instrukce (<! a <?), '/>' v textu (za znakem '>'
+# bez '<') a '/>' v hodnotě atributu (následuje uvozovka dříve než '<').
+# Výrazy mohou označit i bezpečnou část (např. '>' v hodnotě atributu), pak
+# se použije pouze pomalejší přesný průchod.
+XML_UNSAFE = (re.compile(rb"<[!?]"), re.compile(rb">[^<>]*/>"),
+              re.compile(rb"/>[^<\"']*[\"']"))
+
+# Dělení vstupu na dávky elementů nejvyšší úrovně. Iterace vrací dávky
+# (úvod dokumentu až po první element nejvyšší úrovně, nezměněné bajty
+# elementů, koncová značka kořene), po jejím skončení obsahuje 'tag' původní
+# tag kořene a 'text' jeho text (text před prvním podelementem).
+# Hloubka zanoření na konci každého úseku o velikosti 'size' se určí
+# z počtu značek v úseku (bytes.count(), bez průchodu jednotlivými elementy),
+# token po tokenu (XML_TOKEN) se prochází pouze od konce úseku k nejbližší
+# hranici elementu nejvyšší úrovně, úvod a závěr dokumentu a úseky, ve kterých
+# počet značek hloubku neurčuje (XML_UNSAFE).
+# Správnost obsahu dávek ověřují pracovní procesy při jejich analýze, hlavní
+# proces kontroluje strukturu kořene a konec dokumentu.
+class XmlSplitter:
+    """deleni vstupu na davky elementu nejvyssi urovne"""
+
+    def __init__(self, raw, size=JOB_BYTES):
+        self.raw = raw
+        self.size = size
+        self.buf = b""
+        self.eof = False
+        self.tag = None
+        self.text = None
+
+    def more(self):
+        """nacte dalsi blok vstupu, vraci False na konci vstupu"""
+
+        block = self.raw.read(JOB_BLOCK)
+        if not block:
+            self.eof = True
+            return False
+        self.buf += block
+        return True
+
+    def depth(self, start, stop):
+        """vraci hloubku na pozici stop dle poctu znacek od hranice start,
+        nebo None, pokud ji nelze urcit"""
+
+        buf = self.buf
+        for pattern in XML_UNSAFE:
+            if pattern.search(buf, start - 1, stop):
+                return None
+        return (1 + buf.count(b"<", start, stop) - 2 * buf.count(b"</", start, stop)
+                - buf.count(b"/>", start, stop))
+
+    def scan(self, pos, depth, stop):
+        """prochazi tokeny od pozice pos v hloubce depth, vraci (pozice, konec)
+        prvni hranice elementu nejvyssi urovne za pozici stop (konec = pozice
+        koncove znacky korene), nebo None pri nedostatku dat"""
+
+        buf = self.buf
+        for match in XML_TOKEN.finditer(buf, pos):
+            if match.start() != pos:
+                return None
+            pos = match.end()
+            if match.group(2) is not None:
+                depth -= 1
+                if depth == 0:
+                    return match.start(1), True
+            elif match.group(3) is not None:
+                continue
+            elif buf[pos - 2] != 47:
+                depth += 1
+                continue
+            if depth == 1 and pos >= stop:
+                return pos, False
+        return None
+
+    def prolog(self):
+        """vraci (uvod dokumentu, koncova znacka korene, pozice prvniho
+        elementu nejvyssi urovne nebo konce korene, konec korene)"""
+
+        while True:
+            buf = self.buf
+            pos = 0
+            qname = None
+            for match in XML_TOKEN.finditer(buf):
+                if match.start() != pos:
+                    break
+                pos = match.end()
+                if match.group(3) is not None:
+                    continue
+                start = match.start(1)
+                if qname is None:
+                    qname = re.match(rb"<([^\s/>]+)", buf[start:pos]).group(1)
+                    if buf[pos - 2] == 47:
+                        return buf[:pos], b"", pos, True
+                    continue
+                return buf[:start], b"</" + qname + b">", start, match.group(2) is not None
+            if not self.more():
+                raise ET.ParseError("neocekavany konec vstupu")
+
+    def finish(self, pos, tail):
+        """overi koncovou znacku korene na pozici pos a zaver dokumentu"""
+
+        while not self.eof:
+            self.more()
+        rest = self.buf[pos:]
+        if tail != b"":
+            end = rest.find(b">")
+            if end == -1 or b"".join(rest[2:end].split()) != tail[2:-1]:
+                raise ET.ParseError("koncova znacka neodpovida korenovemu elementu")
+            rest = rest[end + 1:]
+        if re.sub(rb"<!--.*?-->|<\?.*?\?>", b"", rest, flags=re.S).strip() != b"":
+            raise ET.ParseError("nezpracovany obsah za korenovym elementem")
+
+    def __iter__(self):
+        head, tail, pos, end = self.prolog()
+        root = fromstring(head + tail)
+        self.tag = root.tag
+        self.text = root.text
+
+        while not end:
+            while not self.eof and len(self.buf) < pos + self.size + JOB_BLOCK:
+                self.more()
+            buf = self.buf
+            stop = pos + self.size
+            result = None
+            if stop < len(buf):
+                stop = buf.find(b"<", stop)
+                if stop != -1:
+                    depth = self.depth(pos, stop)
+                    if depth is not None and depth >= 1:
+                        result = self.scan(stop, depth, stop)
+                    else:
+                        result = self.scan(pos, 1, stop)
+            if result is None:
+                if self.more():
+                    continue
+                # konec vstupu, zbytek se prochází celý
+                result = self.scan(pos, 1, len(buf) + 1)
+                if result is None:
+                    raise ET.ParseError("neocekavany konec vstupu")
+
+            cut, end = result
+            if buf.find(b"<", pos, cut) != -1:
+                yield head + buf[pos:cut] + tail
+            if end:
+                pos = cut
+                break
+
+            # ponechá se znak '>' před hranicí (viz XML_UNSAFE)
+            self.buf = buf[cut - 1:]
+            pos = 1
+
+        self.finish(pos, tail)
+
+# Převod slovníku tabulek do podoby, kterou lze uložit ve formátu JSON
+# (a zpět), pořadí tabulek i sloupců je zachováno - každá tabulka je uložena
+# jako trojice [tag, [[atribut, typ], ...], [[cizí klíč, četnost], ...]].
+def work_dump(work_dict):
+    """vraci slovnik tabulek ve tvaru pro ulozeni do JSON"""
+
+    return [[table.tag, list(table.atributs.items()), list(table.fkey.items())]
+            for table in work_dict.values()]
+
+def work_load(data):
+    """vraci slovnik tabulek sestaveny z dat ulozenych pomoci work_dump()"""
 
+    work_dict = {}
+    for tag, atributs, fkeys in data:
+        table = TableElement(tag)
+        table.atributs = dict(atributs)
+        table.fkey = dict(fkeys)
+        work_dict[tag] = table
+    return work_dict
+
+# Funkce analyzuje jeden vstupní soubor do samostatného slovníku tabulek,
+# volaná při zpracování více vstupních souborů (i v pracovních procesech).
+# Vrací dvojici (dílčí slovník tabulek, původní tag kořenového elementu).
+def do_xml_file(path, param_a):
+    """analyzuje jeden vstupni soubor"""
+
+    part = {}
+    try:
+        with input_open(path) as istream:
+            root_tag = do_xml_stream(istream, param_a, part)
+    except PARSE_ERRORS:
+        raise XtdFormatError("Vstupni soubor neni validni XML soubor")
+    return part, root_tag
+
+# Zpracování více vstupních souborů do jediné struktury tabulek, každý soubor
+# se analyzuje samostatně a dílčí výsledky se slučují v pořadí souborů.
+# S parametrem --jobs jsou soubory analyzovány paralelně.
+# Vrací původní tag kořenového elementu prvního souboru (pro získání jmenného
+# prostoru).
+def do_xml_files(paths, param_a, work_dict, jobs):
+    """analyzuje vice vstupnich souboru do jednoho slovniku tabulek"""
+
+    root_tag = None
+    if jobs > 1:
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=jobs, initializer=parser_select,
+                initargs=(PARSER_BACKEND,)) as pool:
+            results = pool.map(do_xml_file, paths, itertools.repeat(param_a),
+                               chunksize=16)
+            for part, tag in results:
+                merge_work(work_dict, part)
+                if root_tag is None:
+                    root_tag = tag
+    else:
+        for path in paths:
+            part, tag = do_xml_file(path, param_a)
+            merge_work(work_dict, part)
+            if root_tag is None:
+                root_tag = tag
+    return root_tag
+
+# Zpracování vstupních souborů s využitím uložených výsledků (--cache).
+# Pro každý soubor je v cache uložen jeho dílčí slovník tabulek spolu s cestou,
+# časem poslední změny, velikostí a otiskem obsahu (SHA-256). Soubor se znovu
+# analyzuje pouze tehdy, pokud pro něj v cache záznam chybí nebo se změnil jeho
+# obsah - otisk se počítá jen u souborů se změněným časem nebo velikostí.
+# Dílčí výsledky se slučují v pořadí souborů, výstup je tedy totožný se
+# zpracováním bez cache. Cache se po zpracování přepíše záznamy aktuálních
+# vstupních souborů.
+CACHE_VERSION = 1
+
+def file_hash(path):
+    """vraci otisk obsahu souboru"""
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as data:
+        for block in iter(lambda: data.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def cache_load(cache_path):
+    """nacte ulozene vysledky, pri chybe vraci prazdnou cache"""
 
-    for key in counter:
-        key = key.lower()
-        work_dict[root.tag.lower()].givefkey(key, counter[key])
+    try:
+        with open(cache_path, "r") as data:
+            cache = json.load(data)
+        if cache.get("version") == CACHE_VERSION:
+            return cache["files"]
+    except (OSError, ValueError, KeyError, AttributeError):
+        pass
+    return {}
+
+def cache_save(cache_path, files):
+    """ulozi vysledky, soubor se nahrazuje atomicky"""
+
+    tmp_path = cache_path + ".tmp"
+    try:
+        with open(tmp_path, "w") as data:
+            json.dump({"version": CACHE_VERSION, "files": files}, data)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        raise XtdOutputError("Nepovedlo se ulozit soubor s vysledky analyzy")
+
+def do_xml_cached(paths, param_a, work_dict, jobs, cache_path):
+    """analyzuje vstupni soubory s vyuzitim ulozenych vysledku"""
+
+    cached = cache_load(cache_path)
+    entries = {}
+    stale = []
+
+    for path in paths:
+        key = os.path.abspath(path)
+        stat = os.stat(path)
+        entry = cached.get(key)
+        if entry is not None and entry["a"] == bool(param_a):
+            if entry["mtime"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+                entries[key] = entry
+                continue
+            digest = file_hash(path)
+            if entry["hash"] == digest:
+                entry["mtime"] = stat.st_mtime_ns
+                entry["size"] = stat.st_size
+                entries[key] = entry
+                continue
+        else:
+            digest = file_hash(path)
+        entries[key] = {"mtime": stat.st_mtime_ns, "size": stat.st_size,
+                        "hash": digest, "a": bool(param_a)}
+        stale.append(path)
+
+    # analýza nových a změněných souborů
+    if jobs > 1 and len(stale) > 1:
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=jobs, initializer=parser_select,
+                initargs=(PARSER_BACKEND,)) as pool:
+            results = list(pool.map(do_xml_file, stale, itertools.repeat(param_a),
+                                    chunksize=16))
+    else:
+        results = [do_xml_file(path, param_a) for path in stale]
+    for path, (part, tag) in zip(stale, results):
+        entry = entries[os.path.abspath(path)]
+        entry["root"] = tag
+        entry["tables"] = work_dump(part)
+
+    root_tag = None
+    for path in paths:
+        entry = entries[os.path.abspath(path)]
+        merge_work(work_dict, work_load(entry["tables"]))
+        if root_tag is None:
+            root_tag = entry["root"]
+
+    cache_save(cache_path, entries)
+    return root_tag
+
+# funkce jež slouží pro průchod stromem který byl vytvořen pomocí ET.parse().
+# nemá návratovou hodnotu, jejím výsledkem je sestavená hierarchie tabulek,
+# atributů a cizých klíčů v zadaeném slovníku.
+# informace o existenci parametru '-a' je předávána pomocí promněnné 'param_a'
+# v případě, že je přítomna, negenerují se sloupce z atributů.
+# Průchod je implementován bez rekurze pomocí explicitního zásobníku, hloubka
+# dokumentu tedy není omezena limitem rekurze interpretu. Každá položka
+# zásobníku obsahuje (element, tag převedený na malá písmena, čítač potomků,
+# iterátor přes potomky). Na zásobník se ukládají pouze elementy s potomky,
+# listové elementy se zpracují přímo a místo vlastního slovníku sdílí prázdný
+# čítač NO_CHILDREN.
+def do_xml(tree, root, param_a, work_dict):
+    """funcke analyzuje predanou stromovou strukturu a inicializuje jednotlive tabulky"""
+
+    # potomci korene dokumentu se jako cizi klice nepocitaji
+    counter = None if root is tree.getroot() else {}
+    stack = [(root, name_lower(root.tag), counter, iter(root))]
+
+    while stack:
+        elem, tag, counter, children = stack[-1]
+
+        # listoví potomci se zpracují rovnou, při nalezení potomka s vlastními
+        # podelementy se sestoupí o úroveň níže
+        for child in children:
+            child_tag = NAMES.get(child.tag) or name_lower(child.tag)
+            table_start(child_tag, child.attrib, param_a, counter, work_dict)
+            if len(child):
+                stack.append((child, child_tag, {}, iter(child)))
+                break
+            table_end(child_tag, child.text, NO_CHILDREN, work_dict)
+        else:
+            # vsichni potomci zpracovani, uzavreni elementu
+            stack.pop()
+            if counter is None:
+                if tag in work_dict:
+                    table_end(tag, elem.text, NO_CHILDREN, work_dict)
+            else:
+                table_end(tag, elem.text, counter, work_dict)
+
+# Výstupní vrstva společná pro print_ddl() a print_g(): výstup se skládá
+# z menších částí, které se shromažďují ve vyrovnávací paměti a do výstupního
+# proudu se zapisují po blocích velikosti alespoň 'size' znaků (parametr
+# --buffer), výstup se tak nezapisuje po jednotlivých sloupcích ani se
+# nesestavuje celý v paměti.
+OUTPUT_BUFFER = 1 << 16
+
+class OutputBuffer:
+    """vyrovnavaci pamet vystupu"""
+    def __init__(self, ostream, size=OUTPUT_BUFFER):
+        self.ostream = ostream
+        self.size = size
+        self.parts = []
+        self.length = 0
+
+    def write(self, text):
+        """prida cast vystupu, pri zaplneni vyrovnavaci pameti ji zapise"""
+        self.parts.append(text)
+        self.length += len(text)
+        if self.length >= self.size:
+            self.flush()
+
+    def flush(self):
+        """zapise obsah vyrovnavaci pameti do vystupu"""
+        if self.parts:
+            self.ostream.write("".join(self.parts))
+            self.parts = []
+            self.length = 0
+
+# názvy datových typů sloupců dle jejich číselného kódu
+TYPE_NAMES = (None, "BIT", "INT", "FLOAT", "STR", "NVARCHAR", "NTEXT")
+
+# Slovník pro odstranění jmenného prostoru z názvů, každý název
+# se upravuje pouze jednou (při prvním použití).
+class NamespaceStrip(dict):
+    """slovnik nazvu bez jmenneho prostoru"""
+    def __init__(self, namespace):
+        dict.__init__(self)
+        self.namespace = namespace
+
+    def __missing__(self, name):
+        short = name
+        if name.startswith(self.namespace):
+            short = name[len(self.namespace):]
+        self[name] = short
+        return short
+
+# funkce tiskne hlavičku výstupu, pokud je uživatelem zadána, je tisknuta
+# přednostně na počátek výstupu
+def print_header(out, args):
+    """tiskne zakomentovanou hlavicku vystupu"""
+
+    if len(args.header) == 1:
+        out.write("--" + args.header[0] + "\n\n")
 
 # funkce jež tiskne na zvolený výstup (stdout, nebo zadaný soubor)
 # v předepsané formě, která je otpovídá DDL
 def print_ddl(ostream, args, namespace, work_dict):
     """tiskne vyslednou podobu prikazu pro vytvoreni pozadovanych tabulek"""
 
-    # pokud je uživatelem zadána hlavička, je tisknuta
-    # přednostně na počátek výstupu
-    if len(args.header) == 1:
-        output = "--"
-        output += args.header[0]
-        output += "\n\n"
-        ostream.write(output)
+    out = OutputBuffer(ostream, args.buffer)
+    short = NamespaceStrip(namespace)
+    print_header(out, args)
 
     # pro každou reprezentaci tabulky v setu work_dict se prvně
     # vytvoří danná tabulka, automaticky se z jejího názvu vygeneruje její
     # primární klíč, následně se doplní její cizý klíče a nakonec její atributy
-    for table in work_dict:
-        output = "CREATE TABLE "
-
-        # odstranení namespace
-        if table.startswith(namespace):
-            table = table[len(namespace):]
-        output += table
-        output += "(\n  prk_"
-        output += table
-        output += "_id INT PRIMARY KEY"
-        ostream.write(output)
-
-        for fkey in work_dict[namespace + table].fkey:
-            output = ",\n  "
-
-            # odstranení namespace
-            if fkey.startswith(namespace):
-                fkey = fkey[len(namespace):]
-            output += fkey
-            output += "_id INT"
-            ostream.write(output)
-
-        for atribut in work_dict[namespace + table].atributs:
-            typ = work_dict[namespace + table].atributs[atribut]
-            output = ",\n  "
-
-            # odstranení namespace
-            if atribut.startswith(namespace):
-                atribut = atribut[len(namespace):]
-            output += atribut
-            output += " "
-            if typ == 1:
-                output += "BIT"
-            elif typ == 2:
-                output += "INT"
-            elif typ == 3:
-                output += "FLOAT"
-            elif typ == 4:
-                output += "STR"
-            elif typ == 5:
-                output += "NVARCHAR"
-            elif typ == 6:
-                output += "NTEXT"
-            ostream.write(output)
-
-        ostream.write("\n);\n\n")
-
-# pomocna funkce pro modelaci transitivniho vztahu A -> B pro A -> C -> B
-# parametry jsou:
-# 1. ) tabulka tabulek relací
-# 2. ) pomocná tabulka tabulek relací (nelze přímo zapisovat do rel,
-#      z důvodu změny ve for-cyklu)
-# 3. ) "A"
-# 4. ) "B"
-# 5. ) "C" - přemostění těchto tabulek, jako jediná obsahuje relace jak s A
-#            tak i s B
-def get_rel(rel, helper, rel_a, rel_b, over):
-    """uklada hodnotu kardinalit relace"""
-
-    helper[rel_a][rel_b] = {}
-    helper[rel_a][rel_b]["vlastni"] = rel[rel_a][over]["vlastni"]
-    helper[rel_a][rel_b]["cizy"] = rel[over][rel_b]["cizy"]
-
-# funkce kontroluje transitivitu relací
-# v případě, že se během jedné kontroly generuje alespoň jedna nová,
-# je třeba tuto funky zavolat znovu z důvodů opětovné kontroly
-def transit(rel, helper):
-    changed = False
-    for table in rel:
-        for relation in rel[table]:
-            for far in rel[relation]:
-                if rel[relation][far]["vlastni"] == "1":
-                    if rel[relation][far]["cizy"] == "1":
-                        rel[relation][far]["vlastni"] = "N"
-                        rel[relation][far]["cizy"] = "N"
-
-    # for-cyklus pro nalezeni možných vazeb
-    for over in rel:
-        for rel_a in rel[over]:
-            for rel_b in rel[over]:
-                if rel_b != rel_a:
-                    get_rel(rel, helper, rel_a, rel_b, over)
-
-    # aplikace najitých vazeb do rel z helper, v případě že byla alepoň jedna
-    # najita je funkce transit() volaná znovu, pro opětovnou kontrolu
-    for table in helper:
-        for relation in helper[table]:
-            if relation not in rel[table]:
-                rel[table][relation] = helper[table][relation]
-                changed = True
-        helper[table] = {}
+    # příkaz pro každou tabulku se sestaví a zapíše najednou
+    for name, element in work_dict.items():
+        columns = [short[fkey] + "_id INT" for fkey in element.fkey]
+        columns.extend([short[atribut] + " " + TYPE_NAMES[typ]
+                        for atribut, typ in element.atributs.items()])
+        out.write(ddl_create(short[name], columns))
+
+    out.flush()
+
+def ddl_create(table, columns):
+    """vraci prikaz CREATE TABLE s primarnim klicem a sloupci columns"""
+
+    columns = ["prk_" + table + "_id INT PRIMARY KEY"] + columns
+    return "CREATE TABLE " + table + "(\n  " + ",\n  ".join(columns) + "\n);\n\n"
+
+# ---------------- MIGRACE SCHEMATU ---------------- #
+# Porovnání s dříve uloženým schématem (--diff): obě schémata se převedou na
+# slovník tabulka -> slovník sloupec -> typ (názvy bez jmenného prostoru,
+# sloupce cizích klíčů s typem INT, bez primárního klíče). Předchozí schéma
+# je buď výstup DDL (i s připojenými dřívějšími migracemi ALTER TABLE), nebo
+# soubor JSON uložený parametrem --save-schema (případně holý výstup
+# work_dump()).
+# Pro novou tabulku se vypíše celý příkaz CREATE TABLE, pro nový sloupec
+# ALTER TABLE ... ADD a pro sloupec, jehož typ se rozšířil (pořadí typů
+# BIT < INT < FLOAT < NVARCHAR < NTEXT, stejně jako v give_atr()), ALTER
+# TABLE ... ALTER COLUMN. Typy se nezužují a sloupce ani tabulky se
+# neodstraňují, chybějící sloupce a tabulky se pouze uvedou v komentáři.
+SCHEMA_VERSION = 1
+SCHEMA_RE = re.compile(
+    r"CREATE\s+TABLE\s+([^\s(]+)\s*\((.*?)\)\s*;"
+    r"|ALTER\s+TABLE\s+(\S+)\s+(?:ADD|ALTER\s+COLUMN)\s+(\S+)\s+(\w+)\s*;",
+    re.S | re.I)
+
+def schema_columns(work_dict, namespace):
+    """vraci slovnik tabulka -> slovnik sloupec -> typ"""
+
+    short = NamespaceStrip(namespace)
+    schema = {}
+    for name, element in work_dict.items():
+        columns = {short[fkey] + "_id": INT for fkey in element.fkey}
+        for atribut, typ in element.atributs.items():
+            columns[short[atribut]] = typ
+        schema[short[name]] = columns
+    return schema
+
+def schema_type(name):
+    """vraci typ dle jeho nazvu v DDL"""
 
+    try:
+        return TYPE_NAMES.index(name.upper(), 1)
+    except ValueError:
+        raise XtdFormatError("Neznamy datovy typ " + name + " v souboru se schematem")
+
+def schema_parse(text):
+    """vraci slovnik tabulek z prikazu DDL"""
+
+    schema = {}
+    for match in SCHEMA_RE.finditer(text):
+        if match.group(1) is not None:
+            columns = {}
+            for column in match.group(2).split(","):
+                parts = column.split()
+                if parts == []:
+                    continue
+                if len(parts) < 2:
+                    raise XtdFormatError("Chybny sloupec v souboru se schematem")
+                if "PRIMARY" not in (part.upper() for part in parts):
+                    columns[parts[0]] = schema_type(parts[1])
+            schema[match.group(1)] = columns
+        else:
+            columns = schema.setdefault(match.group(3), {})
+            columns[match.group(4)] = schema_type(match.group(5))
+    return schema
 
-    if changed:
-        transit(rel, helper)
+def schema_load(path):
+    """nacte predchozi schema (DDL nebo JSON)"""
 
-# funkce ktera vypíše do zvoleného výstupu, relace jednotlivých elementů databáze
-# a následně poté se program ukončí (netisknou se příkazy pro sestavení databází)
-def print_g(ostream, args, namespace, work_dict):
-    rel = {}
-    helper = {}
-
-    # inicializace rel seznamu + u kazde tabulky vedeni relace na sebe sama
-    for table in work_dict:
-        helper[table] = {}
-        rel[table] = {}
-        rel[table][table] = {
-            "vlastni": "1",
-            "cizy" : "1"
-        }
-    for table in work_dict:
-        table = table.lower()
+    try:
+        with open(path, "r", encoding="utf-8") as data:
+            text = data.read()
+    except (OSError, UnicodeError):
+        raise XtdInputError("Nepovedlo se otevrit soubor se schematem")
+
+    if text.lstrip()[:1] not in ("{", "["):
+        return schema_parse(text)
+    try:
+        saved = json.loads(text)
+        if isinstance(saved, dict):
+            if saved.get("version") != SCHEMA_VERSION:
+                raise ValueError
+            return schema_columns(work_load(saved["tables"]), saved["namespace"])
+        return schema_columns(work_load(saved), "")
+    except (ValueError, KeyError, TypeError):
+        raise XtdFormatError("Soubor se schematem neni platny")
+
+def schema_save(path, namespace, work_dict):
+    """ulozi vysledne tabulky, soubor se nahrazuje atomicky"""
+
+    tmp_path = path + ".tmp"
+    try:
+        with open(tmp_path, "w") as data:
+            json.dump({"version": SCHEMA_VERSION, "namespace": namespace,
+                       "tables": work_dump(work_dict)}, data)
+        os.replace(tmp_path, path)
+    except OSError:
+        raise XtdOutputError("Nepovedlo se ulozit soubor se schematem")
+
+def print_diff(ostream, args, old, new):
+    """tiskne prikazy pro migraci schematu old na schema new"""
+
+    out = OutputBuffer(ostream, args.buffer)
+    print_header(out, args)
+
+    for table, columns in new.items():
+        if table not in old:
+            out.write(ddl_create(table, [column + " " + TYPE_NAMES[typ]
+                                         for column, typ in columns.items()]))
+            continue
+
+        # rozšíření typů stejně jako při odvozování (TableElement.give_atr())
+        before = TableElement(table)
+        before.atributs = dict(old[table])
+        changed = False
+        for column, typ in columns.items():
+            if column not in before.atributs:
+                out.write("ALTER TABLE " + table + " ADD " + column + " "
+                          + TYPE_NAMES[typ] + ";\n")
+                changed = True
+                continue
+            previous = before.atributs[column]
+            before.give_atr(column, typ)
+            if before.atributs[column] != previous:
+                out.write("ALTER TABLE " + table + " ALTER COLUMN " + column + " "
+                          + TYPE_NAMES[typ] + ";\n")
+                changed = True
+        for column in old[table]:
+            if column not in columns:
+                out.write("-- sloupec " + table + "." + column
+                          + " chybi v novem schematu (ponechan)\n")
+                changed = True
+        if changed:
+            out.write("\n")
+
+    for table in old:
+        if table not in new:
+            out.write("-- tabulka " + table + " chybi v novem schematu (ponechana)\n\n")
+
+    out.flush()
+
+# Reprezentace relací mezi tabulkami pro parametr '-g':
+# tabulky jsou očíslovány v pořadí slovníku work_dict (n tabulek), pro každou
+# tabulku se uchovává
+#   - order[i]  = pole čísel tabulek, se kterými je v relaci (v pořadí
+#                 vzniku relace, v tomto pořadí se relace vypisují)
+#   - bits[i]   = tatáž množina jako bitová maska (bit j = relace s tabulkou j)
+# kardinality všech relací jsou uloženy v jediné matici bajtů value o velikosti
+# n * n, bajt value[i * n + j] obsahuje příznaky REL_OWN ("vlastni" = N)
+# a REL_FOREIGN ("cizy" = N) relace tabulky i s tabulkou j, nulový kód tedy
+# odpovídá relaci 1:1 (platný je pouze pro dvojice obsažené v bits)
+REL_OWN = 1
+REL_FOREIGN = 2
+REL_MANY = REL_OWN | REL_FOREIGN
+
+# výpis kardinality ve tvaru "cizy:vlastni" dle kódu relace
+REL_NAMES = ("1:1", "1:N", "N:1", "N:N")
+
+def relations(work_dict):
+    """vraci pocatecni relace tabulek dane cizymi klici"""
+
+    names = list(work_dict)
+    index = {name: i for i, name in enumerate(names)}
+    size = len(names)
+
+    # u kazde tabulky vedeni relace na sebe sama
+    order = [array.array("I", (i,)) for i in range(size)]
+    bits = [1 << i for i in range(size)]
+    value = bytearray(size * size)
+
+    for table, i in index.items():
         for key in work_dict[table].fkey:
-            key = key.lower()
+            j = index[key]
 
             # ošetření cyklu A odkazuje do B (N:1)
             #                B odkazuje do A (N:1) nebo naopak.
-            if key in rel[table]:
-                rel[table][key] = {
-                    "vlastni": "N",
-                    "cizy" : "N"
-                }
-                rel[key][table] = {
-                    "vlastni": "N",
-                    "cizy" : "N"
-                }
+            if bits[i] >> j & 1:
+                value[i * size + j] = REL_MANY
+                value[j * size + i] = REL_MANY
             else:
-                rel[table][key] = {
-                    "vlastni": "1",
-                    "cizy" : "N"
-                }
-                rel[key][table] = {
-                    "vlastni": "N",
-                    "cizy" : "1"
-                }
+                order[i].append(j)
+                bits[i] |= 1 << j
+                value[i * size + j] = REL_FOREIGN
+                order[j].append(i)
+                bits[j] |= 1 << i
+                value[j * size + i] = REL_OWN
+
+    return names, order, bits, value
+
+# funkce dopočítá tranzitivní relace A -> B pro A -> C -> B
+# Výpočet probíhá po průchodech, v každém průchodu se
+#   1.) všechny relace 1:1 označí jako N:M (vyjma výpisu relace tabulky se
+#       sebou samou se relace 1:1 nevypisují)
+#   2.) pro každou tabulku A se najdou všechny dosud chybějící relace s
+#       tabulkami B dosažitelnými přes společného souseda C, kardinalita
+#       je dána stranou "vlastni" relace A -> C a stranou "cizy" relace C -> B,
+#       při více společných sousedech rozhoduje ten s nejvyšším číslem
+#   3.) nalezené relace se přidají až po dokončení průchodu, nové relace
+#       tabulky A jsou seřazeny dle nejnižšího čísla společného souseda a
+#       dále dle pořadí B v relacích tohoto souseda
+# Průchody se opakují, dokud vznikají nové relace. Množiny sousedů jsou
+# bitové masky, chybějící relace se tak zjišťují po celých slovech. Tabulky,
+# u kterých se v minulém průchodu nezměnila relace ani jejich ani jejich
+# sousedů, se přeskakují. Relace 1:1 mohou vzniknout pouze nově přidáním,
+# jejich přeznačení se proto provádí již při přidání.
+# Vrací počet provedených průchodů.
+def transit(order, bits, value):
+    """dopocita tranzitivni relace, vraci pocet pruchodu"""
+
+    size = len(bits)
+    for a in range(size):
+        for b in order[a]:
+            if value[a * size + b] == 0:
+                value[a * size + b] = REL_MANY
+
+    passes = 0
+    changed = (1 << size) - 1
+    while True:
+        passes += 1
+        found = []
+        for a, row_bits in enumerate(bits):
+            if not row_bits & changed:
+                continue
+            overs = sorted(order[a])
+            missing = functools.reduce(operator.or_, map(bits.__getitem__, overs))
+            missing &= ~row_bits
+            if not missing:
+                continue
+
+            # pořadí nových relací dle prvního společného souseda
+            new_order = array.array("I")
+            remaining = missing
+            for over in overs:
+                hit = bits[over] & remaining
+                if hit:
+                    new_order.extend(b for b in order[over] if hit >> b & 1)
+                    remaining &= ~hit
+                    if not remaining:
+                        break
+
+            # kardinality dle posledního společného souseda, nové relace se
+            # v tomto průchodu nečtou, lze je tedy zapsat přímo do matice
+            row = a * size
+            remaining = missing
+            for over in reversed(overs):
+                hit = bits[over] & remaining
+                if hit:
+                    own = value[row + over] & REL_OWN
+                    over_row = over * size
+                    for b in order[over]:
+                        if hit >> b & 1:
+                            code = own | (value[over_row + b] & REL_FOREIGN)
+                            value[row + b] = code or REL_MANY
+                    remaining &= ~hit
+                    if not remaining:
+                        break
+
+            found.append((a, missing, new_order))
+
+        if not found:
+            return passes
+
+        changed = 0
+        for a, missing, new_order in found:
+            order[a].extend(new_order)
+            bits[a] |= missing
+            changed |= 1 << a
+
+# funkce vrací relace tabulek (včetně tranzitivních) jako seznam dvojic
+# (tabulka, [(tabulka, typ relace), ...]) v pořadí výpisu parametru '-g',
+# názvy tabulek jsou bez jmenného prostoru, počet průchodů výpočtu
+# tranzitivních relací se započte do statistik stats
+def relation_list(work_dict, namespace, stats=None):
+    """vraci seznam relaci jednotlivych tabulek"""
+
+    names, order, bits, value = relations(work_dict)
+    passes = transit(order, bits, value)
+    if stats is not None:
+        stats.count("transit_passes", passes)
+
+    # názvy tabulek bez jmenného prostoru
+    short = NamespaceStrip(namespace)
+    short = [short[table] for table in names]
+
+    result = []
+    size = len(names)
+    for table in range(size):
+        row = table * size
+        related = []
+        for key in order[table]:
+            code = value[row + key]
+            if key == table:
+                relation_type = "1:1"
+            elif code == REL_MANY or code == 0:
+                relation_type = "N:M"
+            else:
+                relation_type = REL_NAMES[code]
+            related.append((short[key], relation_type))
+        result.append((short[table], related))
+    return result
 
-    transit(rel, helper)
+# funkce ktera vypíše do zvoleného výstupu, relace jednotlivých elementů databáze
+# a následně poté se program ukončí (netisknou se příkazy pro sestavení databází),
+# result jsou již vypočtené relace (viz relation_list())
+def print_g(ostream, args, namespace, work_dict, result=None):
 
     # ------------- VYPIS G-VAZEB ------------------------#
 
-    # pokud je uživatelem zadána hlavička, je tisknuta
-    # přednostně na počátek výstupu
-    if len(args.header) == 1:
-        output = "--"
-        output += args.header[0]
-        output += "\n\n"
-        ostream.write(output)
-
-    output = '<?xml version="1.0" encoding="UTF-8"?>\n'
-    output += "<tables>\n"
-    for table in rel:
-        output += "    <table name=\""
-        # ---- odstraneni namespace
-        if table.startswith(namespace):
-            table = table[len(namespace):]
-        output += table
-        output += "\">\n"
-        # ++++ pridani namespace pro další iterace
-        table = namespace + table
-
-        for key in rel[table]:
-            output += "        <relation to=\""
-            # ---- odstranení namespace
-            if key.startswith(namespace):
-                key = key[len(namespace):]
-            output += key
-            output += "\" relation_type=\""
-            # ++++ pridani namespace pro další iterace
-            key = namespace + key
-            if (rel[table][key]["cizy"] == rel[table][key]["vlastni"]) and (key != table):
-                output += "N:M"
-            elif key == table:
-                output += "1:1"
+    out = OutputBuffer(ostream, args.buffer)
+    print_header(out, args)
+
+    if result is None:
+        result = relation_list(work_dict, namespace)
+
+    out.write('<?xml version="1.0" encoding="UTF-8"?>\n<tables>\n')
+    for table, related in result:
+        out.write("    <table name=\"" + table + "\">\n")
+        for key, relation_type in related:
+            out.write("        <relation to=\"" + key
+                      + "\" relation_type=\"" + relation_type + "\" />\n")
+        out.write("    </table>\n")
+
+    out.write("</tables>\n")
+    out.flush()
+
+# Výpis výsledku normalizovaného slovníku tabulek (společný pro příkazovou
+# řádku, --watch i SchemaInferrer): relace s původními jmény cizích klíčů
+# (-g, slovník tabulek se tím mění), změny oproti předchozímu schématu
+# previous (--diff), nebo příkazy pro vytvoření tabulek. Relace lze předat
+# již vypočtené (result, jména cizích klíčů jsou pak již obnovena).
+def schema_render(ostream, args, namespace, work_dict, old, previous=None, result=None):
+    """vypise relace, zmeny schematu nebo prikazy DDL"""
+
+    if args.g:
+        if old is not None:
+            name_restore(work_dict, old)
+        print_g(ostream, args, namespace, work_dict, result)
+    elif previous is not None:
+        print_diff(ostream, args, previous, schema_columns(work_dict, namespace))
+    else:
+        print_ddl(ostream, args, namespace, work_dict)
+
+# ---------------- EXPORT DAT ---------------- #
+# Export dat (--data=insert, nebo --data=csv): vstup se projde podruhé
+# a pro každý element se vytvoří jeden řádek jeho tabulky se sloupci
+# v pořadí dle print_ddl(): vygenerovaný primární klíč (číslováno od 1 pro
+# každou tabulku), cizí klíče (identifikátory podelementů, nebo s --etc
+# identifikátor rodiče) a sloupce z atributů a textu elementu.
+# Řádky se zapisují po dávkách (--batch) jako příkazy INSERT s více řádky
+# za výstup DDL, do souborů <tabulka>.csv v adresáři --data-dir, nebo se
+# nahrávají přímo do databáze SQLite (--sqlite).
+# Paměťová náročnost je omezena hloubkou dokumentu a velikostí dávek.
+DATA_BATCH = 1000
+
+# Popis řádků jedné tabulky pro export dat:
+#   - name      = název tabulky bez jmenného prostoru
+#   - columns   = názvy sloupců, types = jejich datové typy
+#   - children  = cizí klíč (původní jméno podelementu) -> pozice sloupců pro
+#                 jednotlivé výskyty podelementu
+#   - parents   = tag rodiče -> pozice sloupce (relace obrácená parametrem --etc)
+#   - atributs  = jméno sloupce z atributu nebo textu -> pozice sloupce
+class DataTable:
+    """popis radku jedne tabulky pro export dat"""
+    def __init__(self, element, original, param_b, short):
+        self.name = short[element.tag]
+        self.columns = ["prk_" + self.name + "_id"]
+        self.types = [INT]
+        self.children = {}
+        self.parents = {}
+        self.atributs = {}
+
+        position = {}
+        for fkey in element.fkey:
+            position[fkey] = len(self.columns)
+            self.columns.append(short[fkey] + "_id")
+            self.types.append(INT)
+
+        names = {} if param_b else name_alloc(original)
+        for key in original:
+            if key in names:
+                self.children[key] = [position[name] for name in names[key]]
+            elif key not in position:
+                continue
+            elif original[key] == 0:
+                self.parents[key] = position[key]
             else:
-                output += rel[table][key]["cizy"]
-                output += ":"
-                output += rel[table][key]["vlastni"]
-            output += "\" />\n"
-        output += "    </table>\n"
+                self.children[key] = [position[key]]
+
+        for atribut, typ in element.atributs.items():
+            self.atributs[atribut] = len(self.columns)
+            self.columns.append(short[atribut])
+            self.types.append(typ)
+
+def data_tables(work_dict, old, args, namespace):
+    """vraci popis radku vsech tabulek pro export dat"""
+
+    short = NamespaceStrip(namespace)
+    tables = {}
+    for tag, element in work_dict.items():
+        original = old.get(tag, element.fkey) if old is not None else element.fkey
+        tables[tag] = DataTable(element, original, args.b, short)
+    return tables
+
+# převod hodnoty atributu nebo textu na hodnotu sloupce daného typu,
+# prázdná hodnota číselných sloupců odpovídá NULL
+def data_value(raw, typ):
+    """vraci hodnotu sloupce typu typ"""
+
+    if typ >= NVARCHAR:
+        return raw
+    stripped = raw.strip()
+    if stripped == "":
+        return None
+    if typ == BIT:
+        return "1" if stripped.lower() in ("1", "true") else "0"
+    return stripped
+
+# Proudový průchod vstupem, generuje dvojice (tag tabulky, řádek), čítače
+# primárních klíčů 'ids' jsou sdíleny mezi více vstupními soubory.
+# Zásobník obsahuje pro každou úroveň (element, tag, identifikátor,
+# seznam dvojic (tag, identifikátor) podelementů).
+def data_rows(istream, args, tables, ids, convert=data_value):
+    """generuje radky tabulek pro elementy vstupu"""
+
+    stack = []
+    events = iterparse(istream)
+    for event, elem in events:
+        if event == "start":
+            if stack == []:
+                stack.append((elem, None, None, None))
+                continue
+            tag = NAMES.get(elem.tag) or name_lower(elem.tag)
+            ids[tag] = ids.get(tag, 0) + 1
+            if stack[-1][3] is not None:
+                stack[-1][3].append((tag, ids[tag]))
+            stack.append((elem, tag, ids[tag], []))
+            continue
+
+        elem, tag, ident, children = stack.pop()
+        if tag is None:
+            events_drain(events)
+            break
+
+        table = tables[tag]
+        row = [None] * len(table.columns)
+        row[0] = ident
+
+        occurrence = {}
+        for child, child_id in children:
+            count = occurrence.get(child, 0)
+            occurrence[child] = count + 1
+            positions = table.children.get(child)
+            if positions is not None and count < len(positions):
+                row[positions[count]] = child_id
+
+        parent = stack[-1]
+        if parent[1] in table.parents:
+            row[table.parents[parent[1]]] = parent[2]
+
+        if not args.a:
+            for actual, raw in elem.attrib.items():
+                pos = table.atributs.get(NAMES.get(actual) or name_lower(actual))
+                if pos is not None:
+                    row[pos] = convert(raw, table.types[pos])
+
+        text = elem.text
+        if text is not None and text.strip() != '' and "value" in table.atributs:
+            pos = table.atributs["value"]
+            row[pos] = convert(text, table.types[pos])
+
+        yield tag, row
+
+        # uvolnění zpracovaného podstromu
+        elem.clear()
+        del parent[0][-1]
+
+# zápis hodnoty sloupce jako literálu SQL, číselné hodnoty se zapisují bez
+# uvozovek pouze pokud odpovídají typu sloupce
+# Číselné hodnoty se zapisují v kanonickém tvaru (zápisy přijímané funkcí
+# get_type() jako 1_000, inf nebo číslice jiných písem nejsou literály SQL),
+# nekonečno a NaN nelze v SQL zapsat jako číslo, zapisují se jako NULL.
+def sql_literal(value, typ):
+    """vraci literal SQL pro hodnotu sloupce"""
+
+    if value is None:
+        return "NULL"
+    if isinstance(value, int):
+        return str(value)
+    if typ < NVARCHAR:
+        data = get_type(value)
+        if data == BIT:
+            return "1" if value.lower() in ("1", "true") else "0"
+        if data == INT and typ >= INT:
+            return str(int(value))
+        if data <= typ:
+            number = float(value)
+            return repr(number) if math.isfinite(number) else "NULL"
+    return "'" + value.replace("'", "''") + "'"
+
+class InsertWriter:
+    """zapis radku jako prikazu INSERT s vice radky"""
+    def __init__(self, out, batch):
+        self.out = out
+        self.batch = batch
+        self.rows = {}
+
+    def add(self, table, row):
+        """prida radek tabulky, pri zaplneni davky ji zapise"""
+        rows = self.rows.setdefault(table, [])
+        rows.append(row)
+        if len(rows) >= self.batch:
+            self.flush_table(table)
+
+    def flush_table(self, table):
+        """zapise davku radku tabulky"""
+        rows = self.rows.pop(table, [])
+        if rows == []:
+            return
+        types = table.types
+        values = []
+        for row in rows:
+            values.append("(" + ", ".join(sql_literal(value, types[i])
+                                          for i, value in enumerate(row)) + ")")
+        self.out.write("INSERT INTO " + table.name + " (" + ", ".join(table.columns)
+                       + ") VALUES\n  " + ",\n  ".join(values) + ";\n")
+
+    def close(self):
+        """zapise vsechny zbyvajici davky"""
+        for table in list(self.rows):
+            self.flush_table(table)
+        self.out.flush()
+
+class CsvWriter:
+    """zapis radku do souboru <tabulka>.csv, soubory se otviraji pouze pri
+    zapisu davky, pocet otevrenych souboru tedy nezavisi na poctu tabulek"""
+    def __init__(self, directory, batch):
+        self.directory = directory
+        self.batch = batch
+        self.rows = {}
+        self.started = set()
+
+    def add(self, table, row):
+        """prida radek tabulky, pri zaplneni davky ji zapise"""
+        rows = self.rows.setdefault(table, [])
+        rows.append(row)
+        if len(rows) >= self.batch:
+            self.flush_table(table)
+
+    def flush_table(self, table):
+        """zapise davku radku tabulky, prvni zapis vytvori soubor s hlavickou"""
+        rows = self.rows.pop(table, [])
+        path = os.path.join(self.directory, table.name + ".csv")
+        mode = "a" if table.name in self.started else "w"
+        with open(path, mode, newline="", encoding="utf-8") as data:
+            writer = csv.writer(data)
+            if mode == "w":
+                writer.writerow(table.columns)
+                self.started.add(table.name)
+            writer.writerows(rows)
+
+    def close(self):
+        """zapise vsechny zbyvajici davky"""
+        for table in list(self.rows):
+            self.flush_table(table)
+
+# Nahrávání do databáze SQLite: typy sloupců se převádějí na afinity SQLite,
+# primární klíč je alias rowid. Celé nahrávání probíhá v jediné transakci
+# s vypnutou synchronizací zápisu na disk, řádky se vkládají po dávkách
+# pomocí executemany() a indexy cizích klíčů se vytvoří až po nahrání dat.
+SQLITE_TYPES = (None, "NUMERIC", "INTEGER", "REAL", "TEXT", "TEXT", "TEXT")
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode = MEMORY",
+    "PRAGMA synchronous = OFF",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -65536",
+    "PRAGMA locking_mode = EXCLUSIVE",
+)
+
+# převod hodnoty na typ jazyka Python odpovídající afinitě sloupce
+def sqlite_value(raw, typ):
+    """vraci hodnotu sloupce typu typ pro SQLite"""
+
+    value = data_value(raw, typ)
+    if value is None or typ >= NVARCHAR:
+        return value
+    try:
+        return float(value) if typ == FLOAT else int(value)
+    except ValueError:
+        return value
+
+# jména tabulek a sloupců se uzavírají do uvozovek (mohou kolidovat
+# s klíčovými slovy SQL, např. atribut "order")
+def sqlite_name(name):
+    """vraci jmeno uzavrene do uvozovek pro SQLite"""
+
+    return '"' + name.replace('"', '""') + '"'
+
+class SqliteWriter:
+    """nahravani radku do databaze SQLite"""
+    def __init__(self, path, tables, batch):
+        self.batch = batch
+        self.rows = {}
+        self.conn = sqlite3.connect(path, isolation_level=None)
+        for pragma in SQLITE_PRAGMAS:
+            self.conn.execute(pragma)
+        self.conn.execute("BEGIN")
+        for table in tables.values():
+            columns = [sqlite_name(table.columns[0]) + " INTEGER PRIMARY KEY"]
+            for i in range(1, len(table.columns)):
+                columns.append(sqlite_name(table.columns[i]) + " "
+                               + SQLITE_TYPES[table.types[i]])
+            self.conn.execute("CREATE TABLE " + sqlite_name(table.name) + "(\n  "
+                              + ",\n  ".join(columns) + "\n)")
+        self.tables = tables
+
+    def add(self, table, row):
+        """prida radek tabulky, pri zaplneni davky ji vlozi"""
+        rows = self.rows.setdefault(table, [])
+        rows.append(row)
+        if len(rows) >= self.batch:
+            self.flush_table(table)
+
+    def flush_table(self, table):
+        """vlozi davku radku tabulky"""
+        rows = self.rows.pop(table, [])
+        self.conn.executemany(
+            "INSERT INTO " + sqlite_name(table.name) + " VALUES ("
+            + ", ".join("?" * len(table.columns)) + ")", rows)
+
+    def close(self):
+        """vlozi zbyvajici davky, vytvori indexy cizich klicu a potvrdi transakci"""
+        for table in list(self.rows):
+            self.flush_table(table)
+        for table in self.tables.values():
+            for column in table.columns[1:len(table.columns) - len(table.atributs)]:
+                self.conn.execute("CREATE INDEX " + sqlite_name("idx_" + table.name + "_" + column)
+                                  + " ON " + sqlite_name(table.name)
+                                  + "(" + sqlite_name(column) + ")")
+        self.conn.execute("COMMIT")
+        self.conn.close()
+
+# Řízení exportu dat, vstupní soubory se procházejí v pořadí zadání.
+def data_export(files, args, namespace, work_dict, old, ostream):
+    """exportuje data vstupnich souboru"""
+
+    tables = data_tables(work_dict, old, args, namespace)
+    convert = data_value
+    if args.data == "sqlite":
+        try:
+            writer = SqliteWriter(args.sqlite[0], tables, args.batch)
+        except sqlite3.Error:
+            raise XtdOutputError("Nepovedlo se vytvorit tabulky v databazi SQLite")
+        convert = sqlite_value
+    elif args.data == "csv":
+        try:
+            os.makedirs(args.data_dir[0], exist_ok=True)
+        except OSError:
+            raise XtdOutputError("Nepovedlo se vytvorit adresar pro data")
+        writer = CsvWriter(args.data_dir[0], args.batch)
+    else:
+        writer = InsertWriter(OutputBuffer(ostream, args.buffer), args.batch)
 
-    output += "</tables>\n"
-    ostream.write(output)
+    ids = {}
+    try:
+        for path in files:
+            with input_open(path) as istream:
+                for tag, row in data_rows(istream, args, tables, ids, convert):
+                    writer.add(tables[tag], row)
+        writer.close()
+    except PARSE_ERRORS:
+        raise XtdFormatError("Vstupni soubor neni validni XML soubor")
+    except (OSError, sqlite3.Error):
+        raise XtdOutputError("Nepovedlo se zapsat data")
+
+# Funkce volaná s parametrem '--etc=n', vazby s více jak n stejnojmennými
+# podelementy obrátí, tj. odstraní cizí klíč z tabulky rodiče a tabulce
+# podelementu přidá cizí klíč rodiče (s počtem výskytů 0)
+# S strict=False (parametr --fkey-cap) se vazby, jejichž obrácení by
+# způsobilo konflikt jmen, ponechají beze změny.
+def etc_check(work_dict, num, strict=True):
+    """obraceni vazeb s vice jak num stejnojmennymi podelementy"""
+
+    for table, element in work_dict.items():
+        fkey = element.fkey
+        for key in [key for key, count in fkey.items() if count > num]:
+            child = work_dict[key]
+            if table in child.fkey:
+                if not strict:
+                    continue
+                raise XtdConflictError("Konflikt jmen cizých klíčů při konverzi tabulek")
+            child.givefkey(table, 0)
+            del fkey[key]
 
 # Funkce volaná pokud není zadán parametr '-b', kontroluje počty výskytů cizých
 # klíčů v jednotlivých tabulkách, pokud je tento počet vyšší jak
@@ -449,134 +2259,780 @@ def print_g(ostream, args, namespace, work_dict):
 # tabulce.
 # Výjimka: v případě že v tabulce již existuje klíč ve tvaru "nazevn" je zvolené
 # n posunuto o jedna, dokud tato podmínka není porušena
+# Tabulkám s přejmenovanými klíči se přiřadí nový slovník cizých klíčů,
+# původní slovníky se nemění a funkce je vrací (tabulka -> původní cizí klíče)
+# pro obnovení původních jmen funkcí name_restore() (parametr '-g').
 def name_check(work_dict):
     """funcke pro kontrolu poctu vyskytu stejnojmennych elementu"""
 
-    # zaloha
-    old = copy.deepcopy(work_dict)
+    old = {}
+    for table, element in work_dict.items():
+        name_table(table, element, old)
+    return old
 
-    for table in work_dict:
-        del_key = []
-        local_elem = TableElement(table)
-        for key in work_dict[table].fkey:
-            if work_dict[table].fkey[key] > 1:
-                count = work_dict[table].fkey[key]
-                i = 1
-                while i < (count + 1):
-                    if key + str(i) in work_dict[table].fkey:
-                        count += 1
-                    else:
-                        tag = key + str(i)
-                        local_elem.givefkey(tag, INT)
-                    i += 1
-                del_key.append(key)
-            else:
-                local_elem.givefkey(key, work_dict[table].fkey[key])
+# přejmenování cizích klíčů jedné tabulky (viz name_check()), původní cizí
+# klíče přejmenované tabulky se uloží do slovníku old
+def name_table(table, element, old):
+    """prejmenuje vicenasobne cizi klice tabulky"""
+
+    fkey = element.fkey
+    names = name_alloc(fkey)
+    if names == {}:
+        return
+
+    # klíče s jediným výskytem zůstávají, přejmenované se přidají za ně
+    renamed = {key: count for key, count in fkey.items() if count <= 1}
+    for key in names:
+        for name in names[key]:
+            renamed[name] = INT
+
+    old[table] = fkey
+    element.fkey = renamed
+
+# funkce vrací pro každý cizí klíč s četností vyšší jak jedna seznam jmen,
+# pod kterými budou jednotlivé výskyty uloženy (viz name_check())
+# Jména se tvoří po blocích: pro chybějících n jmen se vytvoří jména
+# s následujícími n čísly a odfiltrují se jména již existujících cizích klíčů
+# tabulky, dokud není jmen dost (výsledek odpovídá přidělování po jednom
+# jméně s přeskočením obsazených, počet vytvořených jmen je tedy roven
+# četnosti a počtu kolizí).
+def name_alloc(fkey):
+    """vraci slovnik cizy klic -> seznam jmen jeho vyskytu"""
+
+    names = {}
+    for key, count in fkey.items():
+        if count > 1:
+            names[key] = name_range(key, count, fkey)
+    return names
+
+def name_range(key, count, fkey):
+    """vraci count volnych jmen klice key"""
+
+    names = []
+    start = 1
+    while len(names) < count:
+        stop = start + count - len(names)
+        block = map(key.__add__, map(str, range(start, stop)))
+        names.extend(itertools.filterfalse(fkey.__contains__, block))
+        start = stop
+    return names
+
+# funkce obnoví původní jména cizých klíčů změněná funkcí name_check()
+def name_restore(work_dict, old):
+    """obnovi puvodni jmena cizych klicu"""
+
+    for table in old:
+        work_dict[table].fkey = old[table]
+
+# Struktura pro validaci (rozšíření VAL) sestavená ze slovníku tabulek po
+# úpravě jmen cizých klíčů (name_check()), pro každou tabulku obsahuje dvojici
+# (množina povolených cizých klíčů, slovník sloupců s maximálním typem).
+def valid_schema(work_dict):
+    """vraci strukturu povolenych tabulek, cizych klicu a typu sloupcu"""
+
+    return {tag: (frozenset(table.fkey), dict(table.atributs))
+            for tag, table in work_dict.items()}
+
+# Funkce pro rozšíření: VAL, parametry příjmá: string obsahující umístění souboru,
+# parametry programu v promněnné args a strukturu vrácenou valid_schema(),
+# při úspěsné validaci nic nevrací, pří chybě vyvolá výjimku XtdError
+# s chybovou hláškou a hodnotou 91 (2 a 4 při chybě otevření a zpracování
+# souboru)
+# Soubor pro validaci se zpracovává proudově v jediném průchodu a validace
+# končí při prvním elementu, atributu nebo typu, který nelze vložit do
+# struktury tabulek. Každý element souboru pro validaci musí odpovídat
+# existující tabulce, jeho atributy a text existujícím sloupcům s vyšším nebo
+# stejným typem a jeho podelementy existujícím cizím klíčům.
+# Jména cizých klíčů se určují stejně jako ve funkci name_check(), tj. dle
+# maximální četnosti podelementu v dané tabulce - při četnosti vyšší jak jedna
+# se ověřují jména nazev1 ... nazevN ihned, jméno bez čísla se ověří až na
+# konci souboru, pokud maximální četnost zůstala rovna jedné.
+def valid_check(to_valid, args, schema):
+    """funkce pro validaci souboru, pri chybe vyvola XtdError"""
 
-        if local_elem.fkey != {}:
-            for key in local_elem.fkey:
-                work_dict[table].givefkey(key, local_elem.fkey[key])
-            for key in del_key:
-                work_dict[table].removefkey(key)
-    return old
+    try:
+        with input_open(to_valid) as valdata:
+            valid_source(valdata, args, schema)
+    except OSError:
+        raise XtdInputError("Nepovedlo se otevrit zvoleny soubor")
 
-# Funkce pro rozšíření: VAL, parametry příjmá: string obsahující umístění souboru
-# a parametry programu v promněnné args, při úspěsné validaci nic nevrací,
-# pří chybě při validaci ukončí program s chybovou hláškou a 91
-def valid_check(to_valid, args, old_table, work_dict, val_dict):
-    """funkce pro validaci, bez navratove hodnoty, ukoncuje program v pripade chyby"""
+# validace již otevřeného vstupu (soubor, nebo io.StringIO), viz valid_check()
+def valid_source(source, args, schema):
+    """funkce pro validaci otevreneho vstupu, pri chybe vyvola XtdError"""
 
     try:
-        valdata = open(to_valid, "r")
-    except:
-        print_err("Nepovedlo se otevrit zvoleny soubor", 2)
+        seen = parser_retry(source, args.backend,
+                            lambda backend: valid_stream(source, args, schema, backend))
+    except PARSE_ERRORS:
+        raise XtdFormatError("Vstupni soubor pro validaci neni validni XML soubor")
+
+    for (tag, key), count in seen.items():
+        if count == 1 and key not in schema[tag][0]:
+            valid_fkey_err()
+
+def valid_fkey_err():
+    """vyvola chybu validace pri nepovolenem cizim klici"""
+
+    err_text = "Cizý klíč tabulky ze souboru"
+    err_text += " pro validaci nelze vlozit do tabulky zadane vstupnim souborem "
+    raise XtdValidError(err_text)
+
+def valid_type(atributs, name, data):
+    """overi, ze hodnotu typu data lze vlozit do sloupce name"""
+
+    if name not in atributs:
+        err_text = "Atribut ze zadanáho souboru"
+        err_text += " pro validaci se neshoduje s atributy výsledných tabulek "
+        raise XtdValidError(err_text)
+
+    if data > atributs[name]:
+        err_text = "Atribut ze zadaného souboru"
+        err_text += " pro validaci má vyšší datový typ než je stanoven základním souborem"
+        raise XtdValidError(err_text)
+
+# Proudový průchod souborem pro validaci, vrací slovník maximálních četností
+# podelementů (tabulka, cizí klíč) -> četnost pro závěrečnou kontrolu.
+def valid_stream(istream, args, schema, backend=None):
+    """proudove overi soubor pro validaci"""
+
+    seen = {}
+    stack = []
+    root = None
+
+    events = iterparse(istream, backend)
+    for event, elem in events:
+        if event == "start":
+            if root is None:
+                root = elem
+                stack.append((elem, None, None))
+                continue
+
+            tag = elem.tag.lower()
+            if tag not in schema:
+                raise XtdValidError("Tabulky vlozene souborem pro validaci nejsou shodne"
+                                    " s tabulkami definovanymi vstupnim souborem")
+
+            counter = stack[-1][2]
+            if counter is not None:
+                counter[tag] = counter.get(tag, 0) + 1
+
+            if not args.a:
+                atributs = schema[tag][1]
+                for actual in elem.attrib:
+                    data = get_type(elem.attrib[actual])
+                    if data == STR:
+                        data = NVARCHAR
+                    valid_type(atributs, actual.lower(), data)
+
+            stack.append((elem, tag, {}))
+            continue
+
+        elem, tag, counter = stack.pop()
+        if tag is None:
+            events_drain(events)
+            break
+
+        text = elem.text
+        if text is not None and text.strip() != '':
+            data = get_type(text)
+            if data == STR:
+                data = NTEXT
+            valid_type(schema[tag][1], "value", data)
+
+        fkeys = schema[tag][0]
+        for key, count in counter.items():
+            if args.b:
+                if key not in fkeys:
+                    valid_fkey_err()
+                continue
+
+            # ověřují se pouze dosud neověřená jména nazev1 ... nazevN
+            checked = seen.get((tag, key), 0)
+            if count > checked:
+                seen[(tag, key)] = count
+                if count > 1:
+                    for i in range(checked + 1 if checked > 1 else 1, count + 1):
+                        if key + str(i) not in fkeys:
+                            valid_fkey_err()
+
+        # uvolnění zpracovaného podstromu
+        elem.clear()
+        del stack[-1][0][-1]
+
+    return seen
+
+# ---------------- REZIM SERVERU ---------------- #
+# Režim serveru (--serve): struktura tabulek vstupního souboru se sestaví
+# pouze jednou a server následně odpovídá na požadavky na validaci.
+# Požadavky i odpovědi jsou objekty JSON, každý na samostatném řádku:
+#   požadavek  {"id": ..., "file": "cesta"} nebo {"id": ..., "data": "<xml>"}
+#   odpověď    {"id": ..., "valid": true/false, "code": n, "error": "text"}
+# kde code je návratová hodnota, kterou by skončila validace (--isvalid),
+# tj. 0 při úspěchu, 91 při nevalidním souboru, 2 a 4 při chybě jeho
+# otevření a zpracování, 1 při chybném požadavku.
+# Požadavky se čtou ze standardního vstupu (odpovědi na výstup, v pořadí
+# dokončení), nebo s parametrem --socket z Unix socketu. Požadavky jsou
+# zpracovávány souběžně (SERVE_THREADS vláken), struktura pro validaci se
+# během činnosti serveru nemění a vlákna ji tedy sdílí.
+SERVE_THREADS = 8
+
+def serve_request(line, args, schema):
+    """zpracuje jeden pozadavek na validaci, vraci odpoved"""
 
     try:
-        tree = ET.parse(valdata)  # parse an open file
-        root = tree.getroot()
-    except:
-        print_err("Vstupni soubor pro validaci neni validni XML soubor", 4)
+        request = json.loads(line)
+        if not isinstance(request, dict):
+            raise ValueError
+    except ValueError:
+        return {"id": None, "valid": False, "code": 1, "error": "Chybny pozadavek"}
 
-    do_xml(tree, root, args.a, val_dict)
+    response = {"id": request.get("id")}
+    try:
+        if isinstance(request.get("data"), str):
+            valid_source(io.StringIO(request["data"]), args, schema)
+        elif isinstance(request.get("file"), str):
+            valid_check(request["file"], args, schema)
+        else:
+            raise XtdParamError("Chybny pozadavek")
+    except XtdError as err:
+        response.update(valid=False, code=err.code, error=err.text)
+    else:
+        response.update(valid=True, code=0)
+    return response
+
+def serve_stdin(istream, ostream, args, schema):
+    """obsluhuje pozadavky ze vstupu istream, odpovedi zapisuje do ostream"""
+
+    lock = threading.Lock()
+
+    def answer(line):
+        response = json.dumps(serve_request(line, args, schema))
+        with lock:
+            ostream.write(response + "\n")
+            ostream.flush()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=SERVE_THREADS) as pool:
+        for line in istream:
+            if line.strip() != "":
+                pool.submit(answer, line)
+
+class ValidHandler(socketserver.StreamRequestHandler):
+    """obsluha jednoho spojeni, pozadavky se zpracovavaji postupne"""
+    def handle(self):
+        for line in self.rfile:
+            if line.strip() == b"":
+                continue
+            response = serve_request(line.decode("utf-8"), self.server.args,
+                                     self.server.schema)
+            self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+
+class ValidServer(socketserver.ThreadingUnixStreamServer):
+    """server pro validaci, kazde spojeni obsluhuje samostatne vlakno"""
+    daemon_threads = True
+
+def serve_socket(path, args, schema):
+    """obsluhuje pozadavky na Unix socketu path"""
 
-    # B - parametr
-    # ošetření případu, kdy je v jedné tabulce více stejnojmenných klíčů
-    # v případě, že je zadán parametr '-b', se tato oprava neprovádí
-    # a program se chová jakoby byl zadán pouze jediný takový
-    # informace o upravenych jmenech ulozena do promnených deleted
-    if not args.b:
-        old_val_table = name_check(val_dict)
+    try:
+        server = ValidServer(path, ValidHandler)
+    except OSError:
+        print_err("Nepovedlo se vytvorit socket serveru", 3)
 
-    # Tělo validace -
-    # Hierarchie tabulek je uložena v globalní promněnné val_dict
+    server.args = args
+    server.schema = schema
 
-    for val in work_dict:
+    # ukončení serveru signálem SIGTERM (stejně jako při přerušení)
+    signal.signal(signal.SIGTERM, lambda number, frame: sys.exit(0))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.unlink(path)
 
-        # kontrola zda-li extují stejné tabulky
-        if val not in work_dict:
-            err_text = "Některý název zabulky ze souboru"
-            err_text += " pro validaci nelze vložit do vysledne hierarchie"
-            print_err(err_text, 91)
+# Funkce pro kontrolu kolize jmenprimárních a cizých klíčů.
+# Případně jmen primárních klíčů, nebo cizých klíčů a atributů (volá se pro
+# každou tabulku ze schema_inspect()).
+# Kontrola jedné tabulky, jména sloupců se vyhledávají přímo ve slovníku
+# atributů (čas je úměrný počtu cizích klíčů). Při více kolizích se hlásí
+# ta, na kterou by narazil průchod atributy v jejich pořadí pro první
+# kolidující cizí klíč.
+# Pozn.: primární klíč se zde (na rozdíl od výpisu "prk_") kontroluje
+# ve tvaru "pkr_" + tabulka + "_id", chování je ponecháno.
+def inspect_table(table, element):
+    """kontrola kolizi klicu a atributu jedne tabulky"""
+
+    atributs = element.atributs
+    primary = "pkr_" + table + "_id"
+    for key in element.fkey:
+        column = key + "_id"
+
+        # Ošetření případu kdy se primární klíč tabulky shoduje s cizým
+        # klíčem tabulky
+
+        if primary == column:
+            raise XtdConflictError("Konflikt jména primárního a cizýho klíče tabulky")
+
+        # Kontrola Atributů tabulky, zda-li nekolidují s primárními a
+        # cizými klíči tabulek
+
+        if column in atributs:
+            if primary in atributs:
+                order = list(atributs)
+                if order.index(primary) < order.index(column):
+                    raise XtdConflictError("Konflikt jména atributu a primárního klíče tabulky")
+            raise XtdConflictError("Konflikt jména atributu a cizýho klíče tabulky")
+        if primary in atributs:
+            raise XtdConflictError("Konflikt jména atributu a primárního klíče tabulky")
+
+# Normalizace schématu po odvození: obrácení vazeb (--etc, etc je None bez
+# parametru, a --fkey-cap, cap je None bez parametru), úprava jmen cizích
+# klíčů (pokud není zadán parametr '-b') a kontrola kolizí jmen. Jednotlivé
+# fáze lze volat i samostatně (run() je měří pro --stats), úprava jmen
+# nevyvolává chyby, pořadí hlášených kolizí je tedy stejné.
+# Vrací původní cizí klíče přejmenovaných tabulek (viz name_check()), nebo
+# None s parametrem '-b'.
+def schema_normalize(work_dict, etc, param_b, cap=None):
+    """normalizace slovniku tabulek"""
+
+    schema_etc(work_dict, etc, cap)
+    old = schema_names(work_dict, param_b)
+    schema_inspect(work_dict)
+    return old
 
-        # kontrola zda-li v daných tabulkách existují stejné cizý klíče
-        try:
-            for fkey in val_dict[val].fkey:
-                if fkey not in work_dict[val].fkey:
-                    err_text = "Cizý klíč tabulky ze souboru"
-                    err_text += " pro validaci nelze vlozit do tabulky zadane vstupnim souborem "
-                    print_err(err_text, 91)
-        except KeyError:
-            print_err("Tabulky vlozene souborem pro validaci nejsou shodne s tabulkami definovanymi vstupnim souborem", 91)
+def schema_etc(work_dict, etc, cap=None):
+    """obraceni vazeb dle parametru --etc a --fkey-cap"""
+
+    if etc is not None:
+        etc_check(work_dict, etc)
+    if cap is not None:
+        etc_check(work_dict, cap, strict=False)
+
+def schema_names(work_dict, param_b):
+    """uprava jmen cizich klicu, vraci puvodni cizi klice"""
+
+    if param_b:
+        return None
+    old = {}
+    for table, element in work_dict.items():
+        name_table(table, element, old)
+    return old
+
+def schema_inspect(work_dict):
+    """kontrola kolizi jmen vsech tabulek"""
+
+    for table, element in work_dict.items():
+        inspect_table(table, element)
+
+# funkce vrací jmenný prostor kořenového elementu ve tvaru "{uri}"
+def root_namespace(root_tag):
+    """vraci jmenny prostor korenoveho elementu"""
+
+    if root_tag is not None and root_tag[0] == "{":
+        namespace = root_tag[root_tag.find("{")+1:root_tag.find("}")]
+        return "{" + namespace + "}"
+    return ""
 
+# ---------------- KNIHOVNI ROZHRANI ---------------- #
+# Rozhraní pro použití v jiném programu (bez spouštění xtd.py jako procesu):
+#
+#     inferrer = SchemaInferrer(etc=2)
+#     inferrer.feed(b"<root>...</root>")       # bajty, text, nebo otevřený
+#     inferrer.feed_file("data.xml.gz")        # soubor, opakovaně
+#     print(inferrer.ddl())
+#     inferrer.validate(b"<root>...</root>")   # při chybě XtdValidError
+#     inferrer.validate_file("jiny.xml")
+#
+# Dokumenty se analyzují proudově stejně jako vstup programu a jejich
+# výsledky se slučují v pořadí vkládání (jako při více vstupních souborech).
+# Dokument, jehož analýza selže, výsledek nezmění. Chyby se hlásí výjimkami
+# XtdError (XtdFormatError, XtdInputError, XtdConflictError, XtdValidError),
+# program se neukončuje. Výsledné tabulky (po --etc, úpravě jmen cizích
+# klíčů a kontrole kolizí) se počítají až při prvním dotazu a uchovávají se
+# do vložení dalšího dokumentu. Backend parseru "auto" se volí dle úvodu
+# prvního vloženého (nebo ověřovaného) dokumentu a dále se nemění.
+class SchemaInferrer:
+    """odvozeni tabulek z opakovane vkladanych dokumentu XML"""
+
+    def __init__(self, a=False, b=False, etc=None, parser="etree", fkey_cap=None):
+        if parser not in PARSERS or (parser == "lxml" and lxml_etree is None):
+            raise XtdParamError("chyba v parametru --parser")
+        if b and (etc is not None or fkey_cap is not None):
+            raise XtdParamError("Nepovolena kombinace parametru -b a --etc nebo --fkey-cap")
+        # backend parseru a jména převedená na malá písmena patří instanci,
+        # výchozí backend (PARSER_BACKEND) a sdílený slovník NAMES se nemění
+        self.parser = parser
+        self.backend = None if parser == "auto" else parser_choose(parser)
+        self.names = {}
+        self.args = argparse.Namespace(a=a, b=b, g=0, etc=etc, fkey_cap=fkey_cap,
+                                       header=[], buffer=OUTPUT_BUFFER,
+                                       backend=self.backend)
+        self.work = {}
+        self.root_tag = None
+        self.result = None
+        self.old = None
+        self.valid = None
+
+    def feed(self, data):
+        """analyzuje dokument zadany jako bajty, text nebo otevreny soubor"""
+
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            data = io.BytesIO(data)
+        elif isinstance(data, str):
+            data = io.StringIO(data)
+        self.resolve(data)
+        self.merge(lambda part: do_xml_stream(data, self.args.a, part, self.backend,
+                                              self.names))
+
+    def feed_file(self, path):
+        """analyzuje vstupni soubor (i komprimovany)"""
 
-        # kontrola zdali u daných tabulek jsou shodné atributy, následně zda-li
-        # odpovídají i datové typy atributů - atribut s nižším datovým typem
-        # může být vložen do atributu s vyšším typem, tato operace ovšem není
-        #
         try:
-            for atr in val_dict[val].atributs:
-                if atr not in work_dict[val].atributs:
-                    err_text = "Atribut ze zadanáho souboru"
-                    err_text += " pro validaci se neshoduje s atributy výsledných tabulek "
-                    print_err(err_text, 91)
-
-                if val_dict[val].atributs[atr] > work_dict[val].atributs[atr]:
-                    err_text = "Atribut ze zadaného souboru"
-                    err_text += " pro validaci má vyšší datový typ než je stanoven základním souborem"
-                    print_err(err_text, 91)
-        except KeyError:
-            print_err("Atributy vlozene souborem pro validaci nejsou shodne s atributy tabulek definovanymi vstupnim souborem", 91)
+            with input_open(path) as istream:
+                self.feed(istream)
+        except OSError:
+            raise XtdInputError("Nepovedlo se otevrit zvoleny soubor")
 
+    def feed_events(self, events):
+        """analyzuje udalosti ("start"/"end", element) jednoho dokumentu"""
 
-    # upraveni nazvu po kontrole zpět do tvaru nazevN bez N na konci pokud je
-    # zadán argument -g
+        self.merge(lambda part: do_xml_events(events, self.args.a, part, self.names))
 
-    if not args.b and args.g:
-        work_dict = old_table
-        val_dict = old_val_table
+    def resolve(self, istream, files=None):
+        """urci backend parseru "auto" dle ukazky vstupu, viz parser_sample()"""
 
-# Funkce pro kontrolu kolize jmenprimárních a cizých klíčů.
-# Případně jmen primárních klíčů, nebo cizých klíčů a atributů
-def inspect(work_dict):
-    """funkce pro kontrolu moznych kolizi klicu a atrtibutu"""
+        if self.backend is None:
+            self.backend = parser_choose(self.parser, parser_sample(istream, files))
+            self.args.backend = self.backend
 
-    for table in work_dict:
-        for key in work_dict[table].fkey:
+    def merge(self, analyze):
+        """slouci vysledek analyzy jednoho dokumentu"""
+
+        part = {}
+        try:
+            root_tag = analyze(part)
+        except PARSE_ERRORS:
+            raise XtdFormatError("Vstupni soubor neni validni XML soubor")
+        merge_work(self.work, part)
+        if self.root_tag is None:
+            self.root_tag = root_tag
+        self.result = None
+        self.valid = None
+
+    def tables(self):
+        """vraci vysledny slovnik tabulek"""
+
+        if self.result is None:
+            work_dict = work_load(work_dump(self.work))
+            args = self.args
+            self.old = schema_normalize(work_dict, args.etc, args.b, args.fkey_cap)
+            self.result = work_dict
+        return self.result
+
+    def namespace(self):
+        """vraci jmenny prostor korenoveho elementu prvniho dokumentu"""
+
+        return root_namespace(self.root_tag)
+
+    def render(self, header=None, g=0, previous=None):
+        """vraci vystup schema_render() pro vysledny slovnik tabulek"""
+
+        args = argparse.Namespace(**vars(self.args))
+        args.g = g
+        if header is not None:
+            args.header = [header]
+        work_dict = self.tables()
+        if g:
+            # relace se vypisují s původními jmény cizích klíčů
+            work_dict = work_load(work_dump(work_dict))
+        out = io.StringIO()
+        schema_render(out, args, self.namespace(), work_dict, self.old, previous)
+        return out.getvalue()
+
+    def ddl(self, header=None):
+        """vraci prikazy pro vytvoreni tabulek"""
+
+        return self.render(header)
+
+    def diff(self, path, header=None):
+        """vraci prikazy pro migraci schematu ze souboru path (DDL nebo JSON)"""
+
+        return self.render(header, previous=schema_load(path))
+
+    def relations(self):
+        """vraci relace tabulek (parametr -g)"""
+
+        work_dict = self.tables()
+        if self.old is not None:
+            # relace se počítají s původními jmény cizích klíčů
+            work_dict = work_load(work_dump(work_dict))
+            name_restore(work_dict, self.old)
+        return relation_list(work_dict, self.namespace())
+
+    def schema(self):
+        """vraci strukturu pro validaci"""
+
+        if self.valid is None:
+            self.valid = valid_schema(self.tables())
+        return self.valid
+
+    def validate(self, data):
+        """overi dokument (bajty, text nebo otevreny soubor), pri chybe XtdError"""
+
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            data = io.BytesIO(data)
+        elif isinstance(data, str):
+            data = io.StringIO(data)
+        self.resolve(data)
+        valid_source(data, self.args, self.schema())
+
+    def validate_file(self, path):
+        """overi vstupni soubor, pri chybe XtdError"""
+
+        self.resolve(None, [path])
+        valid_check(path, self.args, self.schema())
+
+    def is_valid(self, data):
+        """vraci True, pokud dokument odpovida tabulkam"""
+
+        try:
+            self.validate(data)
+        except XtdValidError:
+            return False
+        return True
+
+# ---------------- SLEDOVANI VSTUPU ---------------- #
+# Režim sledování (--watch): vstupy (--input, adresáře a vzory se rozvíjí
+# vždy znovu) se kontrolují každých --interval sekund. Pro každý soubor se
+# uchovává trojice (čas poslední změny a velikost, dílčí slovník tabulek ve
+# tvaru work_dump(), původní tag kořenového elementu), znovu se analyzují
+# pouze nové a změněné soubory (s --jobs paralelně). Dílčí výsledky se slučují
+# v pořadí souborů, výsledek je tedy totožný se zpracováním všech souborů
+# najednou. Výstup (DDL, nebo s '-g' relace) se zapíše pouze pokud se změnil,
+# soubor --output se nahrazuje atomicky.
+# Chyby analýzy jednotlivých souborů a konflikty jmen se vypisují na stderr
+# (u souboru se ponechá poslední platný dílčí výsledek) a sledování
+# pokračuje. Změny se zjišťují dotazováním (os.stat()), bez závislosti na
+# inotify. Sledování ukončí přerušení programu (Ctrl+C).
+WATCH_INTERVAL = 1.0
+
+def watch_file(path, param_a):
+    """analyzuje jeden sledovany soubor, vraci (dump, tag, chyba)"""
+
+    try:
+        part, root_tag = do_xml_file(path, param_a)
+    except XtdFormatError:
+        return None, None, "Vstupni soubor {} neni validni XML soubor".format(path)
+    except OSError:
+        return None, None, "Nepovedlo se otevrit soubor {}".format(path)
+    return work_dump(part), root_tag, None
+
+def watch_scan(args, state, pool):
+    """znovu analyzuje nove a zmenene soubory, vraci True pri zmene"""
 
-            # Ošetření případu kdy se primární klíč tabulky shoduje s cizým
-            # klíčem tabulky
+    try:
+        files = input_files(args.input)
+    except XtdError:
+        files = []
 
-            if "pkr_" + table + "_id" == key + "_id":
-                print_err("Konflikt jména primárního a cizýho klíče tabulky", 90)
+    current = {}
+    changed = []
+    for path in files:
+        try:
+            info = os.stat(path)
+        except OSError:
+            continue
+        stamp = (info.st_mtime_ns, info.st_size)
+        entry = state.get(path)
+        if entry is not None and entry[0] == stamp:
+            current[path] = entry
+        else:
+            current[path] = None
+            changed.append((path, stamp))
 
-            # Kontrola Atributů tabulky, zda-li nekolidují s primárními a
-            # cizými klíči tabulek
+    paths = [path for path, _ in changed]
+    if pool is not None and len(paths) > 1:
+        results = pool.map(watch_file, paths, itertools.repeat(args.a))
+    else:
+        results = (watch_file(path, args.a) for path in paths)
+    for (path, stamp), (dump, root_tag, error) in zip(changed, results):
+        if error is not None:
+            sys.stderr.write("ERROR:" + error + "\n")
+            # ponechá se poslední platný dílčí výsledek souboru
+            if path in state:
+                dump, root_tag = state[path][1], state[path][2]
+        current[path] = (stamp, dump, root_tag)
+
+    modified = list(current) != list(state) or any(
+        current[path][1:] != state[path][1:] for path, _ in changed)
+    state.clear()
+    state.update(current)
+    return modified
+
+def watch_render(args, state):
+    """vraci vystup pro aktualni dilci vysledky souboru"""
 
-            for atribut in work_dict[table].atributs:
-                if key + "_id" == atribut:
-                    print_err("Konflikt jména atributu a cizýho klíče tabulky", 90)
-                if "pkr_" + table + "_id" == atribut:
-                    print_err("Konflikt jména atributu a primárního klíče tabulky", 90)
+    work_dict = {}
+    root_tag = None
+    for _, dump, tag in state.values():
+        if dump is None:
+            continue
+        merge_work(work_dict, work_load(dump))
+        if root_tag is None:
+            root_tag = tag
+
+    out = io.StringIO()
+    old = schema_normalize(work_dict, args.etc, args.b, args.fkey_cap)
+    schema_render(out, args, root_namespace(root_tag), work_dict, old)
+    return out.getvalue()
+
+def watch_write(args, text):
+    """zapise vystup rezimu sledovani"""
+
+    if args.output == []:
+        sys.stdout.write(text)
+        sys.stdout.flush()
+        return
+    tmp_path = args.output[0] + ".tmp"
+    try:
+        with open(tmp_path, "w") as data:
+            data.write(text)
+        os.replace(tmp_path, args.output[0])
+    except OSError:
+        raise XtdOutputError("Nepovedlo se otevrit zvoleny soubor")
+
+def watch(args, files):
+    """sleduje vstupni soubory a pri zmene prepisuje vystup"""
+
+    sample = parser_sample(None, files) if args.parser == "auto" else b""
+    parser_select(args.parser, sample)
+
+    state = {}
+    last = None
+    with contextlib.ExitStack() as stack:
+        pool = None
+        if args.jobs > 1:
+            pool = stack.enter_context(concurrent.futures.ProcessPoolExecutor(
+                max_workers=args.jobs, initializer=parser_select,
+                initargs=(PARSER_BACKEND,)))
+        try:
+            while True:
+                if watch_scan(args, state, pool):
+                    try:
+                        text = watch_render(args, state)
+                    except XtdError as err:
+                        sys.stderr.write("ERROR:" + err.text + "\n")
+                        text = last
+                    if text != last:
+                        watch_write(args, text)
+                        last = text
+                time.sleep(args.interval)
+        except KeyboardInterrupt:
+            pass
+
+# ---------------- STATISTIKY ---------------- #
+# Statistiky zpracování (--stats, --stats-file, proměnná XTD_STATS): pro každou
+# fázi se zaznamená doba běhu, procesorový čas a špička paměti procesu (RSS)
+# na konci fáze, dále čítače (navštívené elementy, volání get_type(), počty
+# tabulek a cizích klíčů, průchody výpočtu tranzitivních relací).
+# Fáze měří run() obalením volání jednotlivých funkcí. Navštívené elementy se
+# počítají obalením událostí parseru (pouze jediný vstup zpracovaný
+# sekvenčně), volání get_type() dle statistik jeho mezipaměti (hodnoty do
+# TYPE_CACHE_LEN znaků), bez zapnutých statistik je režie nulová. Čítače
+# zahrnují pouze práci hlavního procesu (ne pracovních procesů --jobs).
+class Stats:
+    """statistiky jednotlivych fazi zpracovani"""
+    def __init__(self, enabled):
+        self.enabled = enabled
+        self.stages = []
+        self.counters = {}
+
+    def stage(self, name):
+        """kontext merici jednu fazi zpracovani"""
+        if not self.enabled:
+            return NO_STATS
+        return self.measure(name)
+
+    @contextlib.contextmanager
+    def measure(self, name):
+        """mereni jedne faze zpracovani"""
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield
+        finally:
+            self.stages.append({"stage": name,
+                                "wall": time.perf_counter() - wall,
+                                "cpu": time.process_time() - cpu,
+                                "peak_rss_kib": peak_rss()})
+
+    def count(self, name, number=1):
+        """zvysi hodnotu citace"""
+        self.counters[name] = self.counters.get(name, 0) + number
+
+    def events(self, events):
+        """vraci udalosti parseru, pri zapnutych statistikach pocita elementy"""
+        if not self.enabled:
+            return events
+        return self.counted(events)
+
+    def counted(self, events):
+        """udalosti parseru s pocitanim elementu"""
+        count = self.count
+        for event, elem in events:
+            if event == "start":
+                count("elements")
+            yield event, elem
+
+    def report(self, stream, path):
+        """vypise statistiky na stream, nebo je ulozi do souboru path (JSON)"""
+        info = classify_cached.cache_info()
+        self.counters["get_type"] = info.hits + info.misses
+        self.counters["get_type_cache_hits"] = info.hits
+        if path is not None:
+            with open(path, "w") as data:
+                json.dump({"stages": self.stages, "counters": self.counters},
+                          data, indent=2)
+                data.write("\n")
+            return
+        stream.write("{:<24} {:>10} {:>10} {:>16}\n".format(
+            "faze", "cas [s]", "cpu [s]", "spicka RSS [KiB]"))
+        for stage in self.stages:
+            rss = stage["peak_rss_kib"]
+            stream.write("{:<24} {:>10.4f} {:>10.4f} {:>16}\n".format(
+                stage["stage"], stage["wall"], stage["cpu"], "-" if rss is None else rss))
+        for name, value in self.counters.items():
+            stream.write("{:<24} {:>10}\n".format(name, value))
+
+NO_STATS = contextlib.nullcontext()
+
+def peak_rss():
+    """vraci spicku pameti procesu v KiB (None, pokud ji nelze zjistit)"""
+
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS uvádí hodnotu v bajtech, Linux v KiB
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+# zapnutí statistik dle parametrů, výpis proběhne při ukončení programu
+def stats_start(args):
+    """vraci objekt statistik zpracovani"""
+
+    stats = Stats(args.stats > 0 or args.stats_file != [])
+    if stats.enabled:
+        path = args.stats_file[0] if args.stats_file else None
+        atexit.register(stats.report, sys.stderr, path)
+    return stats
+
+def stats_tables(stats, work_dict):
+    """zaznamena pocty tabulek, cizich klicu a sloupcu"""
+
+    if stats.enabled:
+        stats.counters["tables"] = len(work_dict)
+        stats.counters["fkeys"] = sum(len(table.fkey) for table in work_dict.values())
+        stats.counters["atributs"] = sum(len(table.atributs) for table in work_dict.values())
 
 # Řídící tělo programu
 # 1. )  analýza parametrů programu + ošetření vstupního a výstupního souboru,
@@ -590,24 +3046,41 @@ def inspect(work_dict):
 #
 # ----- TELO PROGRAMU --------- #
 
+# Chyby zpracování vyvolané jako XtdError (viz SchemaInferrer) ukončí program
+# s odpovídající návratovou hodnotou.
 def main():
+    try:
+        run()
+    except XtdError as err:
+        print_err(err.text, err.code)
+
+def run():
     # Slovníky, používané téměř každou funkcí, proto jsou často jejich ukazatele
     # předávány do parametrů funkcí, druhou možnou implementací, by bylo je
     # uvést globálně
 
     work_dict = {}
-    val_dict = {}
 
     args = param_check()
-    istream = sys.stdin
+    stats = stats_start(args)
+    istream = None
     ostream = sys.stdout
 
     # ---- OSETRENI PRI ZADANEM VSTUPNIM SOUBORU ---- #
-    if len(args.input) == 1:
-        try:
-            istream = open(args.input[0], "r")
-        except:
-            print_err("Nepovedlo se otevrit zvoleny soubor", 2)
+    # více vstupních souborů se otevírá postupně až při jejich zpracování,
+    # vstup (soubor i stdin) se čte binárně, viz input_stream()
+    inputs = contextlib.ExitStack()
+    files = input_files(args.input)
+    if args.watch:
+        watch(args, files)
+        sys.exit(0)
+    try:
+        if files == []:
+            istream = input_stream(sys.stdin.buffer)
+        elif len(files) == 1 and args.cache == []:
+            istream = inputs.enter_context(input_open(files[0]))
+    except OSError:
+        print_err("Nepovedlo se otevrit zvoleny soubor", 2)
 
     # ---- OSETRENI PRI ZADANEM VYSTUPNIM SOUBORU ---- #
     if len(args.output) == 1:
@@ -616,24 +3089,42 @@ def main():
         except:
             print_err("Nepovedlo se otevrit zvoleny soubor", 3)
 
+    # volba parseru XML (pro --parser=auto dle úvodu vstupu)
+    sample = parser_sample(istream, files) if args.parser == "auto" else b""
+    args.backend = parser_select(args.parser, sample)
+
     # ------------ ZPRACOVÁNÍ VSTUPU ------------#
     # implementováno pomocí xml.elementtree
     # inpirace https://docs.python.org/3.4/library/xml.etree.elementtree.html
+    # vstup se analyzuje proudově pomocí funkce do_xml_stream(), strom
+    # dokumentu se v paměti nesestavuje, s parametrem --jobs paralelně
     try:
-        tree = ET.parse(istream)  # parse an open file
-        root = tree.getroot()
-    except:
+        with stats.stage("do_xml"):
+            if args.cache != []:
+                root_tag = do_xml_cached(files, args.a, work_dict, args.jobs, args.cache[0])
+            elif len(files) > 1:
+                root_tag = do_xml_files(files, args.a, work_dict, args.jobs)
+            elif args.sample is not None:
+                root_tag, observed, counts = do_xml_sample(istream, args.a, work_dict,
+                                                           args.sample, args.seed)
+            elif args.jobs > 1:
+                root_tag = do_xml_parallel(istream, args.a, work_dict, args.jobs)
+            else:
+                root_tag = do_xml_stream(istream, args.a, work_dict, wrap=stats.events)
+    except PARSE_ERRORS:
         print_err("Vstupni soubor neni validni XML soubor", 4)
+    except OSError:
+        print_err("Nepovedlo se otevrit zvoleny soubor", 2)
+
+    # příliš hluboký vstup mohl přepnout backend na etree (viz parser_retry())
+    args.backend = PARSER_BACKEND
 
     # získání jmenného prostoru
-    if root.tag[0] == "{":
-        namespace = root.tag[root.tag.find("{")+1:root.tag.find("}")]
-        namespace = "{" + namespace + "}"
-    else:
-        namespace = ""
+    namespace = root_namespace(root_tag)
 
-    # strom se analyzuje pomocí funkce do_xml()
-    do_xml(tree, root, args.a, work_dict)
+    # varování o málo pozorovaných tabulkách a sloupcích vzorku
+    if args.sample is not None:
+        sample_report(work_dict, observed, counts, namespace)
 
     # ETC - parametr
     # vysetreni parametru --etc = n, tento parametr nesmí být zadán společně s
@@ -642,81 +3133,68 @@ def main():
     # vazba obrácena, a informace uložena do cizýho klíče tabulky na "opačné
     # straně vazby"
 
-    if args.etc != []:
-        try:
-            num = int(args.etc[0])
-        except:
-            print_err("chyba v parametru --etc", 1)
-
-        for table in work_dict:
-            table = table.lower()
-            to_del = []
-            for key in work_dict[table].fkey:
-                key = key.lower()
-                count = work_dict[table].fkey[key]
-                if count > int(num):
-                    if table in work_dict[key].fkey:
-                        print_err("Konflikt jmen cizých klíčů při konverzi tabulek", 90)
-                    work_dict[key].givefkey(table, 0)
-                    to_del.extend([key])
-            for i in to_del:
-                i = i.lower()
-                del work_dict[table].fkey[i]
-
-
     # B - parametr
     # ošetření případu, kdy je v jedné tabulce více stejnojmenných klíčů
     # v případě, že je zadán parametr '-b', se tato oprava neprovádí
     # a program se chová jakoby byl zadán pouze jediný takový
-
-    old_table = None
-    if not args.b:
-        old_table = name_check(work_dict)
-    # ošetření konfliktu názvu sloupců vznikajících z atributů
-    # nebo textového obsahu
-
-    inspect(work_dict)
-
-    # G - parametr
-    # výstupem v tomto případě je XML soubor popu
-    if args.g:
-        if args.isvalid != []:
-            valid_check(args.isvalid[0], args, old_table, work_dict, val_dict)
-            if not args.b:
-                work_dict = old_table
-            print_g(ostream, args, namespace, work_dict)
-
-            if len(args.output) == 1:
-                ostream.close()
-            if len(args.input) == 1:
-                istream.close()
-            sys.exit(0)
+    # ošetření konfliktu názvu sloupců vznikajících z atributů
+    # nebo textového obsahu
+    # (jednotlivé fáze funkce schema_normalize())
+
+    with stats.stage("etc"):
+        schema_etc(work_dict, args.etc, args.fkey_cap)
+    with stats.stage("name_check"):
+        old_table = schema_names(work_dict, args.b)
+    with stats.stage("inspect"):
+        schema_inspect(work_dict)
+    stats_tables(stats, work_dict)
+
+    # rezim serveru pro validaci
+    if args.serve:
+        schema = valid_schema(work_dict)
+        if args.socket != []:
+            serve_socket(args.socket[0], args, schema)
         else:
-            inspect(work_dict)
-            if not args.b:
-                work_dict = old_table
-            print_g(ostream, args, namespace, work_dict)
-
-            if len(args.output) == 1:
-                ostream.close()
-            if len(args.input) == 1:
-                istream.close()
-            sys.exit(0)
-
+            serve_stdin(sys.stdin, ostream, args, schema)
+        if len(args.output) == 1:
+            ostream.close()
+        sys.exit(0)
 
     # Implementace rozšíření VAL
 
     if args.isvalid != []:
-        valid_check(args.isvalid[0], args, old_table, work_dict, val_dict)
-
+        with stats.stage("isvalid"):
+            valid_check(args.isvalid[0], args, valid_schema(work_dict))
 
     # volání funkce pro tisk výsledku do zadaného výstupního souboru = 'ostream'
-    print_ddl(ostream, args, namespace, work_dict)
+    # G - parametr
+    # výstupem v tomto případě je XML soubor popu, jinak příkazy pro vytvoření
+    # tabulek, uložení výsledných tabulek (--save-schema) a výpis pouze změn
+    # oproti předchozímu schématu (--diff), viz schema_render()
+    # předchozí schéma se načte před uložením (--diff a --save-schema mohou
+    # být tentýž soubor)
+    previous = schema_load(args.diff[0]) if args.diff != [] else None
+    if args.save_schema != []:
+        schema_save(args.save_schema[0], namespace, work_dict)
+    result = None
+    if args.g:
+        # relace se počítají s původními jmény cizích klíčů
+        if old_table is not None:
+            name_restore(work_dict, old_table)
+            old_table = None
+        with stats.stage("transit"):
+            result = relation_list(work_dict, namespace, stats)
+    with stats.stage("print_g" if args.g else "print_ddl"):
+        schema_render(ostream, args, namespace, work_dict, old_table, previous, result)
+
+    # export dat vstupu (druhý průchod vstupními soubory)
+    if args.data is not None:
+        with stats.stage("data"):
+            data_export(files, args, namespace, work_dict, old_table, ostream)
 
     if len(args.output) == 1:
         ostream.close()
-    if len(args.input) == 1:
-        istream.close()
+    inputs.close()
     sys.exit(0)
 
 